@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the daily run against local stand-ins for Gemini and
+Google Drive (see bench_servers.py), so no API quota is spent.
+
+For each script length, main() runs from start to finish in a fresh
+interpreter, on a scratch copy of the state files, and the benchmark reports:
+  - wall time per stage (topic selection, script, TTS, upload, reading,
+    episode store, feed, state) and in total
+  - peak RSS of the Python process and of its children (ffmpeg)
+  - bytes sent to and received from each stand-in
+
+Stages overlap: listening and reading run concurrently, and TTS starts while
+the script is still streaming, so stage times do not add up to the total.
+Requires ffmpeg on PATH.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from bench_servers import SCRIPT_SENTENCE, DriveStandIn, GeminiStandIn, StandInConfig
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+# Files main() reads or rewrites
+STATE_PATHS = ["curriculum.json", "user_state.json", "episodes", "read", "feed.xml", "feed_cache.json",
+               "feed-archive", "transcripts"]
+DEFAULT_TURNS = [20, 60, 200]
+# Quotas high enough that the stand-ins, not GeminiClient's rate limiter, set the pace
+# (unless GEMINI_RATE_LIMITS is already set)
+BENCH_RATE_LIMITS = {model: {"rpm": 100_000, "tpm": 100_000_000}
+                     for model in ("gemini-3-pro-preview", "gemini-2.5-pro-preview-tts")}
+# Placeholder OAuth client; the stand-in accepts any token
+BENCH_CREDENTIALS = {"GOOGLE_CLIENT_ID": "benchmark", "GOOGLE_CLIENT_SECRET": "benchmark",
+                     "GOOGLE_REFRESH_TOKEN": "benchmark"}
+
+RUN_PROBE = """
+import functools, inspect, json, os, resource, sys, threading, time
+start = time.perf_counter()
+import main
+from agents.listening_agent import ListeningAgent
+from agents.reading_agent import ReadingAgent
+from utils.drive_client import DriveClient
+from utils.episode_manager import EpisodeManager
+from utils.gemini_client import GeminiClient
+from utils.rss_generator import RSSGenerator
+from utils.state_manager import StateManager
+
+# (stage, owner, attribute): each call of owner.attribute is timed as stage
+STAGES = [
+    ("topics", main, "select_training_topics"),
+    ("script", ListeningAgent, "_stream_script"),
+    ("tts", GeminiClient, "generate_audio_to"),
+    ("upload", DriveClient, "upload_stream"),
+    ("listening", ListeningAgent, "generate_episode"),
+    ("reading", ReadingAgent, "generate_essay"),
+    ("episodes", EpisodeManager, "add_episode"),
+    ("feed", RSSGenerator, "update_feed"),
+    ("state", StateManager, "save_state"),
+]
+stages = {}
+lock = threading.Lock()
+
+def record(stage, began):
+    with lock:
+        entry = stages.setdefault(stage, {"start": began - start, "seconds": 0.0, "calls": 0})
+        entry["seconds"] += time.perf_counter() - began
+        entry["calls"] += 1
+
+def timed(stage, func):
+    if inspect.isgeneratorfunction(func):
+        # Generators are timed from the call until they are exhausted
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                record(stage, began)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, began)
+    return wrapper
+
+for stage, owner, attribute in STAGES:
+    setattr(owner, attribute, timed(stage, getattr(owner, attribute)))
+
+main.main()
+record("total", start)
+sys.stdout.write("BENCH" + json.dumps({
+    "stages": stages,
+    # ru_maxrss is in KiB on Linux
+    "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    "peak_child_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+}) + "\\n")
+"""
+
+
+def scratch_copy() -> str:
+    """Copy the state files into a temp dir so main() cannot touch the real ones."""
+    directory = tempfile.mkdtemp(prefix="bench_pipeline_")
+    for name in STATE_PATHS:
+        source = os.path.join(ROOT, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(directory, name))
+        elif os.path.exists(source):
+            shutil.copy(source, directory)
+    return directory
+
+
+def write_token_cache(path: str):
+    """Seed DriveClient's token cache so it never calls the real OAuth endpoint."""
+    from utils.drive_client import DriveClient
+
+    client = DriveClient.__new__(DriveClient)
+    client.client_id = BENCH_CREDENTIALS["GOOGLE_CLIENT_ID"]
+    client.refresh_token = BENCH_CREDENTIALS["GOOGLE_REFRESH_TOKEN"]
+    with open(path, "w") as f:
+        json.dump({
+            "key": client._token_cache_key(),
+            "token": "benchmark",
+            "expiry": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        }, f)
+
+
+def check_text(directory: str, turns: int):
+    """Fail if the synthetic script did not reach the episode store intact (e.g. mis-decoded accents)."""
+    episodes = os.path.join(directory, "episodes")
+    for name in os.listdir(episodes):
+        with open(os.path.join(episodes, name), encoding="utf-8") as f:
+            if SCRIPT_SENTENCE.split(",")[0] in f.read():
+                return
+    raise RuntimeError(f"Run with {turns} turns stored no script text matching the stand-in's: "
+                       "was the UTF-8 stream mis-decoded?")
+
+
+def run_once(gemini: GeminiStandIn, drive: DriveStandIn, turns: int) -> dict:
+    gemini.turns = turns
+    for server in (gemini, drive):
+        for key in server.stats:
+            server.stats[key] = 0
+
+    directory = scratch_copy()
+    try:
+        token_cache = os.path.join(directory, "drive_token.json")
+        write_token_cache(token_cache)
+        env = dict(os.environ)
+        env.update(BENCH_CREDENTIALS)
+        env.update({
+            "PYTHONPATH": SRC,
+            "GEMINI_API_KEY": "benchmark",
+            "GEMINI_API_BASE_URL": f"{gemini.url}/v1beta/models",
+            "GOOGLE_DRIVE_API_ROOT": f"{drive.url}/",
+            "GOOGLE_DRIVE_FOLDER_ID": "benchmark",
+            "GOOGLE_TOKEN_CACHE": token_cache,
+        })
+        env.setdefault("GEMINI_RATE_LIMITS", json.dumps(BENCH_RATE_LIMITS))
+        env.pop("GEMINI_CACHE_DIR", None)
+        result = subprocess.run([sys.executable, "-c", RUN_PROBE], cwd=directory, env=env,
+                                capture_output=True, text=True, timeout=1800)
+        if result.returncode == 0:
+            check_text(directory, turns)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    marker = result.stdout.rfind("BENCH")
+    if result.returncode != 0 or marker == -1:
+        raise RuntimeError(f"Run with {turns} turns failed:\n{result.stdout}\n{result.stderr}")
+    run = json.JSONDecoder().raw_decode(result.stdout, marker + len("BENCH"))[0]
+    run["turns"] = turns
+    run["gemini"] = dict(gemini.stats)
+    run["drive"] = dict(drive.stats)
+    return run
+
+
+def print_run(run: dict):
+    mb = 1024 * 1024
+    print(f"\n=== {run['turns']} turns ===")
+    print(f"{'stage':<10} {'start':>9} {'wall':>9} {'calls':>6}")
+    for stage, entry in sorted(run["stages"].items(), key=lambda item: item[1]["start"]):
+        print(f"{stage:<10} {entry['start']:>8.2f}s {entry['seconds']:>8.2f}s {entry['calls']:>6}")
+    print(f"peak RSS:  {run['peak_rss_bytes'] / mb:.1f} MB (python), {run['peak_child_rss_bytes'] / mb:.1f} MB (ffmpeg)")
+    for name in ("gemini", "drive"):
+        stats = run[name]
+        print(f"{name + ':':<8}   {stats['requests']} request(s), {stats['rate_limited']} rate limited, "
+              f"{stats['bytes_in'] / mb:.2f} MB sent, {stats['bytes_out'] / mb:.2f} MB received")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=DEFAULT_TURNS, help="Script lengths to run")
+    parser.add_argument("--turn-chars", type=int, default=220, help="Characters per synthetic script turn")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in time to first byte, in seconds")
+    parser.add_argument("--chunk-bytes", type=int, default=16 * 1024, help="Size of each streamed piece")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Delay between streamed pieces, in seconds")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth Gemini request with 429 (0 disables)")
+    parser.add_argument("--drive-rate-limit-every", type=int, default=0,
+                        help="Answer every Nth Drive request with 429 (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After sent with injected 429s")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg is required on PATH")
+        return 1
+
+    sys.path.insert(0, SRC)
+    gemini_config = StandInConfig(latency=args.latency, chunk_bytes=args.chunk_bytes, chunk_delay=args.chunk_delay,
+                                  rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    drive_config = StandInConfig(latency=args.latency, chunk_bytes=args.chunk_bytes, chunk_delay=args.chunk_delay,
+                                 rate_limit_every=args.drive_rate_limit_every, retry_after=args.retry_after)
+    gemini = GeminiStandIn(gemini_config, turn_chars=args.turn_chars).start()
+    drive = DriveStandIn(drive_config).start()
+    try:
+        runs = []
+        for turns in args.turns:
+            run = run_once(gemini, drive, turns)
+            print_run(run)
+            runs.append(run)
+    finally:
+        gemini.stop()
+        drive.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(runs, f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
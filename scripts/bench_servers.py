@@ -0,0 +1,308 @@
+"""
+Local HTTP stand-ins for the Gemini and Google Drive APIs, used by
+bench_pipeline.py to run the daily pipeline without spending API quota.
+
+GeminiStandIn serves models/<model>:streamGenerateContent?alt=sse:
+  - listening prompts get a synthetic script of `turns` turns
+  - reading and brainstorm prompts get a synthetic JSON document
+  - structured-output repair prompts get a value synthesized from responseSchema
+  - TTS requests (responseModalities AUDIO) get silent PCM, sized from the
+    dialogue length like real speech (24kHz 16-bit mono)
+DriveStandIn serves resumable uploads, permissions.create, files.get and
+files.list for Drive v3.
+
+Both take a StandInConfig (latency, streamed chunk size, 429 injection) and
+count requests and bytes in each direction.
+"""
+import base64
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# 24kHz, 16-bit mono PCM, as returned by Gemini TTS
+PCM_BYTES_PER_SECOND = 48000
+# Speaking rate used to size synthetic audio
+CHARS_PER_SECOND = 14.0
+# Repeated to fill synthetic script turns; accented, so a decoding bug shows in the output
+SCRIPT_SENTENCE = "Le lecteur attentif découvre ici une idée nouvelle, puis la suivante. "
+
+
+@dataclass
+class StandInConfig:
+    # Delay before the response headers (time to first byte), in seconds
+    latency: float = 0.05
+    # Size of each streamed piece: SSE text/PCM payload bytes, in bytes
+    chunk_bytes: int = 16 * 1024
+    # Delay between streamed pieces, in seconds
+    chunk_delay: float = 0.0
+    # Answer every Nth request with 429 (0 disables)
+    rate_limit_every: int = 0
+    # Retry-After header sent with injected 429s, in seconds
+    retry_after: int = 1
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, config: StandInConfig):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "bytes_in": 0, "bytes_out": 0}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StandInServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-stream on purpose (e.g. the losing side of a hedged request)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def next_request_rate_limited(self) -> bool:
+        with self.lock:
+            self.stats["requests"] += 1
+            every = self.config.rate_limit_every
+            if every and self.stats["requests"] % every == 0:
+                self.stats["rate_limited"] += 1
+                return True
+            return False
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        self.server.count(bytes_in=len(body))
+        return body
+
+    def write(self, data: bytes):
+        self.wfile.write(data)
+        self.server.count(bytes_out=len(data))
+
+    def begin(self) -> bool:
+        """Apply latency and 429 injection. Returns False if the request was rejected."""
+        time.sleep(self.server.config.latency)
+        if self.server.next_request_rate_limited():
+            self.read_body()
+            self.send_json({"error": {"code": 429, "message": "Resource exhausted (stand-in)"}}, 429,
+                           {"Retry-After": str(self.server.config.retry_after)})
+            return False
+        return True
+
+    def send_json(self, data, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.write(body)
+
+
+class GeminiHandler(StandInHandler):
+    def do_POST(self):
+        if not self.begin():
+            return
+        payload = json.loads(self.read_body() or b"{}")
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        generation_config = payload.get("generationConfig", {})
+        modalities = generation_config.get("responseModalities", [])
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if "AUDIO" in modalities:
+            self.stream_audio(prompt)
+        else:
+            self.stream_text(self.server.text_response(prompt, generation_config.get("responseSchema")))
+        self.write_chunk(b"")
+
+    def write_chunk(self, data: bytes):
+        """Write one HTTP/1.1 chunk (an empty one ends the body)."""
+        self.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_event(self, part: Dict):
+        event = {"candidates": [{"content": {"role": "model", "parts": [part]}}]}
+        # Raw UTF-8 with no charset, as Gemini sends it
+        self.write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+        time.sleep(self.server.config.chunk_delay)
+
+    def stream_text(self, text: str):
+        size = max(1, self.server.config.chunk_bytes)
+        for start in range(0, len(text), size):
+            self.send_event({"text": text[start:start + size]})
+
+    def stream_audio(self, prompt: str):
+        dialogue = prompt.split("### DIALOGUE", 1)[-1]
+        spoken = re.sub(r"^(Tutor|Acteur): ", "", dialogue, flags=re.MULTILINE)
+        remaining = int(len(spoken.strip()) / CHARS_PER_SECOND * PCM_BYTES_PER_SECOND) & ~1
+        size = max(2, self.server.config.chunk_bytes & ~1)
+        while remaining > 0:
+            n = min(size, remaining)
+            self.send_event({"inlineData": {"mimeType": "audio/L16;codec=pcm;rate=24000",
+                                            "data": base64.b64encode(bytes(n)).decode("ascii")}})
+            remaining -= n
+
+
+def sample_value(schema: Dict):
+    """A minimal value matching a Gemini responseSchema."""
+    if "anyOf" in schema:
+        return sample_value(schema["anyOf"][0])
+    kind = schema["type"].upper()
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "OBJECT":
+        return {key: sample_value(schema["properties"][key]) for key in schema.get("required", [])}
+    if kind == "ARRAY":
+        return [sample_value(schema["items"]) for _ in range(max(1, schema.get("minItems", 1)))]
+    return {"STRING": "réparé", "BOOLEAN": True, "INTEGER": 1, "NUMBER": 1.0}[kind]
+
+
+class GeminiStandIn(StandInServer):
+    def __init__(self, config: StandInConfig, turns: int = 60, turn_chars: int = 220):
+        super().__init__(GeminiHandler, config)
+        self.turns = turns
+        self.turn_chars = turn_chars
+
+    def text_response(self, prompt: str, schema: Optional[Dict] = None) -> str:
+        if schema and "--- DOCUMENT ---" in prompt:
+            return json.dumps(sample_value(schema), ensure_ascii=False)
+        if '"role": "tutor_en"' in prompt:
+            return self.script()
+        if '"subtopics"' in prompt:
+            # Brainstorm batch: two topics for each category the schema allows
+            categories = schema["items"]["properties"]["category"]["enum"] if schema else ["literature"]
+            return json.dumps([{
+                "category": category,
+                "topic_name": f"Sujet synthétique {uuid.uuid4().hex[:8]}",
+                "description": "Synthetic benchmark topic",
+                "subtopics": [{"id": f"bench-{i}", "title": f"Partie {i}", "episodes": 2,
+                               "description": "Synthetic"} for i in range(1, 4)],
+            } for category in categories for _ in range(2)], ensure_ascii=False)
+        return self.essay()
+
+    def script(self) -> str:
+        sentence = SCRIPT_SENTENCE
+        turns = []
+        for i in range(self.turns):
+            role = "tutor_en" if i % 4 == 0 else "actor_fr"
+            text = (sentence * (self.turn_chars // len(sentence) + 1))[:self.turn_chars]
+            turns.append({"role": role, "text": f"{i}: {text}"})
+        return "```json\n" + json.dumps(turns, ensure_ascii=False, indent=2) + "\n```"
+
+    def essay(self) -> str:
+        paragraph = "L'énergie se conserve, et l'[[entropie]] augmente. " * 40
+        return json.dumps({
+            "title": "Essai synthétique",
+            "level": "B1",
+            "text": "\n\n".join([paragraph] * 6),
+            "vocabulary": [{"term": "entropie", "gender": "f", "definition": "entropy"}],
+            "exercises": [{"type": "true_false", "question": "L'entropie diminue.", "answer": False}],
+        }, ensure_ascii=False)
+
+
+class DriveHandler(StandInHandler):
+    def do_POST(self):
+        if not self.begin():
+            return
+        url = urlparse(self.path)
+        body = self.read_body()
+        if url.path.startswith("/upload/drive/v3/files"):
+            # Start a resumable session
+            upload_id = uuid.uuid4().hex
+            metadata = json.loads(body or b"{}")
+            self.server.sessions[upload_id] = {"name": metadata.get("name"), "received": 0}
+            self.send_response(200)
+            self.send_header("Location", f"{self.server.url}/upload/drive/v3/files?uploadType=resumable"
+                                         f"&upload_id={upload_id}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif url.path.endswith("/permissions"):
+            self.send_json({"id": "anyoneWithLink"})
+        else:
+            self.send_json({"error": {"code": 404, "message": "Not supported by stand-in"}}, 404)
+
+    def do_PUT(self):
+        if not self.begin():
+            return
+        upload_id = parse_qs(urlparse(self.path).query)["upload_id"][0]
+        session = self.server.sessions[upload_id]
+        body = self.read_body()
+        session["received"] += len(body)
+
+        # Content-Range: bytes first-last/total, with total "*" until the final chunk
+        total = self.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        if total != "*" and session["received"] >= int(total):
+            file_id = upload_id[:16]
+            self.server.files[file_id] = {"id": file_id, "name": session["name"], "size": str(session["received"]),
+                                          "webContentLink": f"{self.server.url}/download/{file_id}"}
+            self.send_json(self.server.files[file_id])
+            return
+        self.send_response(308)
+        self.send_header("Range", f"bytes=0-{session['received'] - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if not self.begin():
+            return
+        path = urlparse(self.path).path
+        if path.rstrip("/") == "/drive/v3/files":
+            # Only name queries are understood; newest first, as for orderBy=createdTime desc
+            name = re.search(r"name = '([^']*)'", parse_qs(urlparse(self.path).query).get("q", [""])[0])
+            files = [file for file in reversed(list(self.server.files.values()))
+                     if name is None or file["name"] == name.group(1)]
+            self.send_json({"files": files[:1]})
+            return
+        file = self.server.files.get(path.rsplit("/", 1)[-1])
+        if file:
+            self.send_json(file)
+        else:
+            self.send_json({"error": {"code": 404, "message": "File not found"}}, 404)
+
+    def do_DELETE(self):
+        if not self.begin():
+            return
+        if self.server.files.pop(urlparse(self.path).path.rsplit("/", 1)[-1], None) is None:
+            self.send_json({"error": {"code": 404, "message": "File not found"}}, 404)
+            return
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class DriveStandIn(StandInServer):
+    def __init__(self, config: StandInConfig):
+        super().__init__(DriveHandler, config)
+        self.sessions: Dict[str, Dict] = {}
+        self.files: Dict[str, Dict] = {}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the daily run.
+
+Measures, in fresh interpreters:
+  - cold import time of src/main.py
+  - time from the start of that import to the first outgoing API request of main()
+    (the request is intercepted and never sent; the run works on a scratch
+    copy of the state files)
+and checks that the heavy client libraries are not imported at startup.
+
+Exits non-zero when a median exceeds its budget in startup_budget.json or a
+deferred module is loaded eagerly. Use --update to rewrite the budget from the
+current measurements (with headroom).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'startup_budget.json')
+# Files main() reads before its first API call
+STATE_PATHS = ["curriculum.json", "user_state.json", "episodes", "read"]
+# Budgets are set this much above the measurement, to absorb runner noise
+HEADROOM = 2.0
+
+# Modules that must only load when first used
+DEFERRED_MODULES = ["googleapiclient", "google.auth", "google.oauth2", "feedgen.feed", "lxml"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+sys.stdout.write("BENCH" + json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}) + "\\n")
+""" % (DEFERRED_MODULES,)
+
+FIRST_CALL_PROBE = """
+import json, os, sys, threading, time
+start = time.perf_counter()
+import main
+from requests.adapters import HTTPAdapter
+
+first = threading.Lock()
+
+def first_request(adapter, request, **kwargs):
+    # Listening and reading start concurrently; only the first request counts
+    first.acquire()
+    # One write, so output from the other thread cannot interleave with it
+    os.write(1, ("\\nBENCH" + json.dumps({"seconds": time.perf_counter() - start}) + "\\n").encode())
+    os._exit(0)
+
+HTTPAdapter.send = first_request
+main.main()
+sys.stdout.write("BENCH" + json.dumps({"seconds": None}) + "\\n")
+"""
+
+
+def run_probe(code: str, cwd: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC
+    env["GEMINI_API_KEY"] = "benchmark"
+    for name in ("GEMINI_CACHE_DIR", "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REFRESH_TOKEN"):
+        env.pop(name, None)
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=120)
+    marker = result.stdout.rfind("BENCH")
+    if marker != -1:
+        return json.JSONDecoder().raw_decode(result.stdout, marker + len("BENCH"))[0]
+    raise RuntimeError(f"Probe produced no result:\n{result.stdout}\n{result.stderr}")
+
+
+def scratch_copy() -> str:
+    """Copy the state files into a temp dir so main() cannot touch the real ones."""
+    directory = tempfile.mkdtemp(prefix="bench_startup_")
+    for name in STATE_PATHS:
+        source = os.path.join(ROOT, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(directory, name))
+        elif os.path.exists(source):
+            shutil.copy(source, directory)
+    return directory
+
+
+def measure(repeat: int) -> dict:
+    import_times = []
+    first_call_times = []
+    loaded = set()
+    for _ in range(repeat):
+        probe = run_probe(IMPORT_PROBE, SRC)
+        import_times.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+
+        directory = scratch_copy()
+        try:
+            probe = run_probe(FIRST_CALL_PROBE, directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        if probe["seconds"] is None:
+            raise RuntimeError("main() finished without making an API call")
+        first_call_times.append(probe["seconds"])
+
+    return {
+        "import_main_seconds": statistics.median(import_times),
+        "first_api_call_seconds": statistics.median(first_call_times),
+        "eagerly_loaded": sorted(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (median is used)")
+    parser.add_argument("--update", action="store_true", help="Rewrite the budget from this run")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    print(f"import main:     {results['import_main_seconds'] * 1000:.0f} ms")
+    print(f"first API call:  {results['first_api_call_seconds'] * 1000:.0f} ms")
+
+    if args.update:
+        budget = {key: round(results[key] * HEADROOM, 3)
+                  for key in ("import_main_seconds", "first_api_call_seconds")}
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"Budget written to {BUDGET_FILE}")
+        return 0
+
+    failures = []
+    if results["eagerly_loaded"]:
+        failures.append(f"deferred modules loaded by 'import main': {', '.join(results['eagerly_loaded'])}")
+    with open(BUDGET_FILE, "r") as f:
+        budget = json.load(f)
+    for key, limit in budget.items():
+        if results[key] > limit:
+            failures.append(f"{key} = {results[key]:.3f}s exceeds budget {limit:.3f}s")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Move the daily drill's state between the JSON files and the SQLite store.
+
+  python scripts/state_db.py migrate   # curriculum.json, user_state.json, episodes/ -> database
+  python scripts/state_db.py export    # database -> the same JSON files (for git and GitHub Pages)
+
+The database path comes from --db, else STATE_DB. Run from the repository root.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils.json_export import export_json, migrate_json  # noqa: E402
+from utils.storage import STATE_DB, SqliteStore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["migrate", "export"])
+    parser.add_argument("--db", default=STATE_DB or "state.db", help="SQLite database (default: STATE_DB or state.db)")
+    parser.add_argument("--root", default=".", help="Directory holding the JSON files")
+    args = parser.parse_args()
+
+    store = SqliteStore(args.db)
+    try:
+        if args.command == "migrate":
+            counts = migrate_json(store, args.root)
+            print(f"Migrated {counts['topics']} topic(s), {counts['progress']} progress entr(ies) and "
+                  f"{counts['episodes']} episode(s) into {args.db}")
+        else:
+            written = export_json(store, args.root)
+            print(f"Exported {args.db} to {os.path.abspath(args.root)} ({written} episode file(s) rewritten)")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,41 @@
-import json
-import os
 import subprocess
+import threading
+from contextlib import ExitStack
+from typing import Iterable, Iterator, Optional
 
 from utils.drive_client import DriveClient
 from utils.gemini_client import GeminiClient
+from utils.json_stream import InvalidJson, iter_json_array
 from utils.prompts import get_gauntlet_listening_prompt, get_listening_prompt
+from utils.run_checkpoint import RunCheckpoint
+from utils.run_trace import propagate, start_span
+from utils.structured_output import SCRIPT_SCHEMA, TURN_SCHEMA, format_path, schema_errors
+
+
+class _CheckedStream:
+    """
+    Readable wrapper that runs on_eof before reporting end of stream,
+    optionally copying everything read into tee. Counts the bytes read.
+    Reads fail once cancel_event is set, so the consumer abandons the stream.
+    """
+
+    def __init__(self, stream, on_eof, tee=None, cancel_event: Optional[threading.Event] = None):
+        self._stream = stream
+        self._on_eof = on_eof
+        self._tee = tee
+        self._cancel_event = cancel_event
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise RuntimeError("ListeningAgent: upload cancelled")
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        if not data:
+            self._on_eof()
+        elif self._tee is not None:
+            self._tee.write(data)
+        return data
 
 
 class ListeningAgent:
@@ -24,88 +55,242 @@ class ListeningAgent:
                 lines.append(f"[FR] {text}")
         return "\n\n".join(lines)
 
-    def generate_episode(self, level: str, topic: str, date_str: str, is_gauntlet: bool = False, topics_summary: str = "") -> tuple:
+    def _check_cancelled(self, cancel_event: Optional[threading.Event]):
+        """Abort between stages if a concurrently running pipeline has failed."""
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError("ListeningAgent: generation cancelled")
+
+    def _synthesize_and_upload(self, script_turns: Iterable[dict], mp3_filename: str,
+                               checkpoint: Optional[RunCheckpoint] = None,
+                               cancel_event: Optional[threading.Event] = None) -> tuple:
         """
-        Generates the audio, uploads to Drive, deletes local file.
-        Returns a tuple of (drive_url, file_size, transcript).
+        Stream TTS audio through ffmpeg into Drive.
+        Setting cancel_event stops TTS from starting further chunks and aborts
+        the upload at its next read.
+        With a checkpoint, PCM chunks and the finished MP3 are also kept in the
+        run directory so a failed upload can be retried without re-synthesis.
+        Returns (drive_url, file_size, file_id).
+        """
+        # Gemini TTS returns raw PCM audio (24kHz, 16-bit, little-endian, mono)
+        ffmpeg = subprocess.Popen([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "s16le",        # Input format: signed 16-bit little-endian
+            "-ar", "24000",       # Sample rate: 24kHz
+            "-ac", "1",           # Channels: mono
+            "-i", "pipe:0",
+            "-codec:a", "libmp3lame",
+            "-qscale:a", "2",
+            "-f", "mp3", "pipe:1"
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        ffmpeg_span = start_span("ffmpeg")
+
+        errors = []
+        stderr_chunks = []
+
+        def synthesize():
+            try:
+                pcm_bytes = self.client.generate_audio_to(
+                    script_turns, ffmpeg.stdin,
+                    chunk_dir=checkpoint.directory if checkpoint else None,
+                    cancel_event=cancel_event,
+                )
+                ffmpeg_span.add(bytes_out=pcm_bytes)
+            except BaseException as e:
+                errors.append(e)
+                ffmpeg.kill()
+            finally:
+                try:
+                    ffmpeg.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        synth_thread = threading.Thread(target=propagate(synthesize), daemon=True)
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(ffmpeg.stderr.read()), daemon=True)
+        synth_thread.start()
+        stderr_thread.start()
+
+        with ExitStack() as mp3_checkpoint:
+            tee = mp3_checkpoint.enter_context(checkpoint.atomic_writer("episode.mp3")) if checkpoint else None
+
+            def check_complete():
+                # Called at end of stream, before the final chunk is committed,
+                # so a failed synthesis or encode never publishes a truncated MP3
+                synth_thread.join()
+                ffmpeg.wait()
+                stderr_thread.join()
+                ffmpeg_span.add(bytes_in=mp3_stream.bytes_read)
+                ffmpeg_span.finish(errors[0] if errors else None)
+                if errors:
+                    raise RuntimeError(f"ListeningAgent: audio synthesis failed: {errors[0]}") from errors[0]
+                if ffmpeg.returncode != 0:
+                    stderr = b"".join(stderr_chunks).decode(errors="replace")
+                    print(f"Error converting audio: {stderr}")
+                    raise subprocess.CalledProcessError(ffmpeg.returncode, "ffmpeg", stderr=stderr)
+                # The MP3 is complete: keep it even if the upload itself fails
+                mp3_checkpoint.close()
+
+            mp3_stream = _CheckedStream(ffmpeg.stdout, check_complete, tee, cancel_event)
+            try:
+                return self.drive_client.upload_stream(mp3_stream, mp3_filename)
+            finally:
+                if ffmpeg.poll() is None:
+                    ffmpeg.kill()
+                ffmpeg.stdout.close()
+                ffmpeg_span.finish()
+
+    def _find_existing_upload(self, mp3_filename: str, checkpoint: Optional[RunCheckpoint]) -> Optional[tuple]:
+        """
+        Return (drive_url, file_size, file_id) if this date's MP3 was already
+        uploaded. A recorded upload is looked up by its file id, so a file of
+        the same name from another attempt is never mistaken for it; the name
+        is only searched for when the record was never written.
+        """
+        if not checkpoint:
+            return None
+        record = checkpoint.load_json("listening_upload.json")
+        if record:
+            if not record.get("file_id"):
+                # Recorded before file ids were kept
+                return record["url"], record["file_size"], None
+            existing = self.drive_client.get_upload(record["file_id"])
+            if existing is None:
+                print(f"ListeningAgent: recorded upload {record['file_id']} is gone from Drive, uploading again")
+            return existing
+        if checkpoint.resume:
+            return self.drive_client.find_upload(mp3_filename)
+        return None
+
+    def discard_upload(self, checkpoint: RunCheckpoint):
+        """
+        Delete the Drive upload recorded in checkpoint, before its artifacts are
+        discarded. The episode generated in its place is uploaded under the
+        same name, and must not be confused with this one.
+        """
+        record = checkpoint.load_json("listening_upload.json")
+        if record and record.get("file_id"):
+            self.drive_client.delete_upload(record["file_id"])
+
+    def _stream_script(self, level: str, topic: str, is_gauntlet: bool, topics_summary: str, turns: list,
+                       cancel_event: Optional[threading.Event] = None,
+                       checkpoint: Optional[RunCheckpoint] = None) -> Iterator[dict]:
+        """
+        Stream the episode script from Gemini, yielding each {role, text} turn
+        as soon as it is complete so TTS can start before the script is done.
+        A turn that is not valid JSON or breaks TURN_SCHEMA is re-asked for on
+        its own, instead of failing the whole script. Repairs wait until the
+        stream is closed, since it holds a rate-limiter slot on the model the
+        repair needs (with the in-flight limit at 1 it would never be freed);
+        the turns after the first broken one are held back until then.
+        Every turn is also appended to turns; the finished script is checkpointed.
         """
         print(f"ListeningAgent: Generating script for level {level}, topic {topic} (Gauntlet={is_gauntlet})...")
 
-        # 1. Generate Script
         if is_gauntlet:
             prompt = get_gauntlet_listening_prompt(level, topics_summary)
         else:
             prompt = get_listening_prompt(level, topic)
 
-        script_text = self.client.generate_content(prompt, model="gemini-3-pro-preview")
-
-        # Clean up script_text
-        script_text = script_text.strip()
-        if script_text.startswith("```json"):
-            script_text = script_text[7:]
-        if script_text.startswith("```"):
-            script_text = script_text[3:]
-        if script_text.endswith("```"):
-            script_text = script_text[:-3]
-        script_text = script_text.strip()
-
+        stream = self.client.stream_content(prompt, profile="listening_script", schema=SCRIPT_SCHEMA)
+        held = []
         try:
-            script_json = json.loads(script_text)
-        except json.JSONDecodeError as e:
+            for turn in iter_json_array(stream, keep_invalid=True):
+                self._check_cancelled(cancel_event)
+                if held or self._turn_problems(len(turns), turn):
+                    held.append(turn)
+                    continue
+                turns.append(turn)
+                yield turn
+        except ValueError as e:
             print(f"Error decoding script JSON: {e}")
             raise
+        finally:
+            stream.close()
 
-        # Format transcript for podcast description
-        transcript = self._format_transcript(script_json)
+        for turn in held:
+            self._check_cancelled(cancel_event)
+            turn = self._repair_turn(prompt, turns, turn)
+            turns.append(turn)
+            yield turn
 
-        # 2. Generate Audio
-        print("ListeningAgent: Synthesizing audio...")
-        audio_data = self.client.generate_audio(script_json)
+        if not turns:
+            raise ValueError("ListeningAgent: script contained no turns")
+        if checkpoint:
+            checkpoint.save_json("listening_script.json", turns)
 
-        # 3. Save to Temporary File and Convert to MP3
-        temp_dir = "content/temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Gemini TTS returns raw PCM audio (24kHz, 16-bit, little-endian, mono)
-        raw_filename = f"daily_drill_{date_str}.pcm"
-        raw_filepath = os.path.join(temp_dir, raw_filename)
-        
+    @staticmethod
+    def _turn_problems(index: int, turn) -> list:
+        """Why the turn at index is broken; empty if it is valid."""
+        path = (index,)
+        if isinstance(turn, InvalidJson):
+            return [f"{format_path(path)}: not valid JSON ({turn.error})"]
+        return [f"{format_path(error_path)}: {problem}"
+                for error_path, problem in schema_errors(turn, TURN_SCHEMA, path)]
+
+    def _repair_turn(self, prompt: str, turns: list, turn) -> dict:
+        """Return turn if it is valid, else a replacement re-asked for from Gemini."""
+        problems = self._turn_problems(len(turns), turn)
+        if not problems:
+            return turn
+        broken = turn.text if isinstance(turn, InvalidJson) else turn
+        return self.client.repair_part(prompt, turns + [broken], (len(turns),), problems, TURN_SCHEMA)
+
+    def generate_episode(self, level: str, topic: str, date_str: str, is_gauntlet: bool = False, topics_summary: str = "",
+                         cancel_event: Optional[threading.Event] = None,
+                         checkpoint: Optional[RunCheckpoint] = None) -> tuple:
+        """
+        Generates the audio and streams it through ffmpeg into Drive.
+        TTS starts on the first complete chunk of turns while the rest of the
+        script is still being generated.
+        If cancel_event is set, stops before starting the next stage, and
+        abandons synthesis and upload if they are under way.
+        With a checkpoint, each stage's artifact is saved to the run directory
+        and stages whose artifact already exists are skipped.
+        Returns a tuple of (drive_url, file_size, transcript).
+        """
         mp3_filename = f"daily_drill_{date_str}.mp3"
-        mp3_filepath = os.path.join(temp_dir, mp3_filename)
 
-        with open(raw_filepath, "wb") as f:
-            f.write(audio_data)
+        # 1. Script: reuse a checkpointed one, or stream it straight into TTS
+        script_json = checkpoint.load_json("listening_script.json") if checkpoint else None
+        if script_json is not None:
+            print("ListeningAgent: Reusing checkpointed script")
+            existing = self._find_existing_upload(mp3_filename, checkpoint)
+            if existing:
+                print(f"ListeningAgent: {mp3_filename} already uploaded, skipping audio stages")
+                return existing[0], existing[1], self._format_transcript(script_json)
+            # Fed as a stream, so plan_chunks packs it greedily exactly as when the
+            # script was first streamed, and the checkpointed chunks line up again
+            script_source = iter(script_json)
+        else:
+            if checkpoint:
+                # Audio left by an attempt whose script never finished belongs to a
+                # different script (chunk names are content hashes, so it would not be
+                # reused anyway); drop it rather than carry it along
+                checkpoint.drop_audio()
+            script_json = []
+            script_source = self._stream_script(
+                level, topic, is_gauntlet, topics_summary, script_json, cancel_event, checkpoint
+            )
 
-        # Convert raw PCM to MP3 using ffmpeg
-        print("ListeningAgent: Converting audio to MP3...")
-        try:
-            result = subprocess.run([
-                "ffmpeg", "-y",
-                "-f", "s16le",        # Input format: signed 16-bit little-endian
-                "-ar", "24000",       # Sample rate: 24kHz
-                "-ac", "1",           # Channels: mono
-                "-i", raw_filepath,
-                "-codec:a", "libmp3lame",
-                "-qscale:a", "2",
-                mp3_filepath
-            ], check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error converting audio: {e.stderr.decode()}")
-            raise
-        finally:
-            # Clean up raw PCM file
-            if os.path.exists(raw_filepath):
-                os.remove(raw_filepath)
+        self._check_cancelled(cancel_event)
+        if checkpoint and checkpoint.has("episode.mp3"):
+            # Audio was already encoded; only the upload is left
+            print(f"ListeningAgent: Uploading checkpointed {mp3_filename} to Google Drive...")
+            drive_url, file_size, file_id = self.drive_client.upload_file(
+                checkpoint.path("episode.mp3"), mp3_filename
+            )
+        else:
+            # 2-4. Synthesize, encode and upload as one streaming pipeline:
+            # script turns -> TTS PCM -> ffmpeg stdin, ffmpeg stdout -> resumable Drive upload
+            print(f"ListeningAgent: Synthesizing, encoding and uploading {mp3_filename}...")
+            drive_url, file_size, file_id = self._synthesize_and_upload(
+                script_source, mp3_filename, checkpoint, cancel_event
+            )
 
-        # 4. Upload to Drive
-        print(f"ListeningAgent: Uploading {mp3_filename} to Google Drive...")
-        drive_url, file_size = self.drive_client.upload_file(mp3_filepath, mp3_filename)
+        if checkpoint:
+            checkpoint.save_json("listening_upload.json",
+                                 {"url": drive_url, "file_size": file_size, "file_id": file_id})
 
-        # 5. Delete Local File
-        try:
-            os.remove(mp3_filepath)
-            print(f"ListeningAgent: Deleted local file {mp3_filepath}")
-        except OSError as e:
-            print(f"Warning: Could not delete temp file: {e}")
+        # Format transcript for podcast description
+        transcript = self._format_transcript(script_json)
 
-        return drive_url, file_size, transcript
\ No newline at end of file
+        return drive_url, file_size, transcript
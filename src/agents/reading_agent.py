@@ -1,43 +1,42 @@
 import json
+from typing import Optional
 
 from utils.gemini_client import GeminiClient
 from utils.prompts import get_gauntlet_reading_prompt, get_reading_prompt
+from utils.run_checkpoint import RunCheckpoint
+from utils.structured_output import READING_SCHEMA
 
 
 class ReadingAgent:
     def __init__(self, client: GeminiClient):
         self.client = client
 
-    def generate_essay(self, level: str, topic: str, date_str: str, is_gauntlet: bool = False, topics_summary: str = "") -> str:
+    def generate_essay(self, level: str, topic: str, date_str: str, is_gauntlet: bool = False, topics_summary: str = "",
+                       checkpoint: Optional[RunCheckpoint] = None) -> str:
         """
         Generates the reading essay for the given topic and level.
-        Returns JSON string with structured reading content.
+        With a checkpoint, a previously generated essay for the run is reused.
+        Returns JSON string with structured reading content (plain text for the Gauntlet),
+        validated against READING_SCHEMA with broken parts repaired.
         """
+        saved = checkpoint.load_json("reading.json") if checkpoint else None
+        if saved is not None:
+            print("ReadingAgent: Reusing checkpointed essay")
+            return saved["content"]
+
         print(f"ReadingAgent: Generating essay for level {level}, topic {topic} (Gauntlet={is_gauntlet})...")
 
         if is_gauntlet:
+            # The Gauntlet essay is plain text
             prompt = get_gauntlet_reading_prompt(level, topics_summary)
+            response_text = self.client.generate_content(prompt, profile="reading_essay").strip()
         else:
             prompt = get_reading_prompt(level, topic)
+            content = self.client.generate_json(prompt, READING_SCHEMA, profile="reading_essay")
+            # Stored as a string, like the rest of the episode record
+            response_text = json.dumps(content, ensure_ascii=False)
 
-        response_text = self.client.generate_content(prompt, model="gemini-3-pro-preview")
-
-        # Clean up JSON response
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-
-        # Validate it's valid JSON, but return as string for storage
-        try:
-            json.loads(response_text)  # Validate
-        except json.JSONDecodeError as e:
-            print(f"Warning: Reading content is not valid JSON: {e}")
-            # Return as-is for backward compatibility
-        
+        if checkpoint:
+            checkpoint.save_json("reading.json", {"content": response_text})
         return response_text
 
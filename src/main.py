@@ -1,57 +1,51 @@
-import json
+import argparse
+import os
 import random
-from datetime import datetime
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import List, Optional
 
 from agents.listening_agent import ListeningAgent
 from agents.reading_agent import ReadingAgent
-from utils.curriculum_manager import CurriculumManager
+from utils.brainstorm_pool import BrainstormPool
+from utils.curriculum_manager import FALLBACK_SUBTOPIC_ID, FALLBACK_TOPIC, CurriculumManager
 from utils.drive_client import DriveClient
 from utils.episode_manager import EpisodeManager
 from utils.gemini_client import GeminiClient
-from utils.prompts import get_brainstorm_prompt
+from utils.json_export import export_json, migrate_json
+from utils.learner_batch import (
+    BATCH_RUNS_DIR,
+    BATCH_WORKERS,
+    LEARNERS_DIR,
+    BatchPlan,
+    GenerationUnit,
+    load_learners,
+)
 from utils.rss_generator import RSSGenerator
+from utils.run_checkpoint import RUNS_DIR, RunCheckpoint
+from utils.run_trace import RUN_HISTORY_FILE, RunTrace, propagate, span
 from utils.state_manager import StateManager
+from utils.storage import STATE_DB, SqliteStore
 
 # Listening draws from literature OR philosophy
 LISTENING_CATEGORIES = ["literature", "philosophy"]
 # Reading draws from physics OR mathematics
 READING_CATEGORIES = ["physics", "mathematics"]
-
-
-def brainstorm_new_topic(gemini_client, curriculum_manager, category: str) -> dict:
-    """Use Gemini to brainstorm a new topic when curriculum runs out."""
-    print(f"Brainstorming new {category} topic...")
-    existing = curriculum_manager.get_existing_topics(category)
-    prompt = get_brainstorm_prompt(category, existing)
-
-    try:
-        response = gemini_client.generate_content(prompt, model="gemini-3-pro-preview")
-        # Clean up response
-        response = response.strip()
-        if response.startswith("```json"):
-            response = response[7:]
-        if response.startswith("```"):
-            response = response[3:]
-        if response.endswith("```"):
-            response = response[:-3]
-        response = response.strip()
-
-        topic_data = json.loads(response)
-
-        # Add to curriculum
-        if curriculum_manager.add_brainstormed_topic(category, topic_data):
-            print(f"Added new brainstormed topic: {topic_data.get('topic_name')}")
-            return topic_data
-    except Exception as e:
-        print(f"Error brainstorming topic: {e}")
-
-    return None
-
-
-def get_topic_with_fallback(
-    gemini_client, curriculum_manager, progress, categories, allow_advanced
-):
-    """Try to get a topic from curriculum, brainstorm if empty."""
+# Subtopics reviewed in a GAUNTLET run, most overdue first (then the next due)
+GAUNTLET_REVIEWS = 10
+# Due reviews slotted into an ordinary training day
+TRAINING_REVIEWS = int(os.environ.get("TRAINING_REVIEWS", "2"))
+# Checkpoint record of a prefetch: the state it was planned against, and whether it finished
+PREFETCH_FILE = "prefetch.json"
+
+
+def get_topic_with_fallback(curriculum_manager, progress, categories, allow_advanced):
+    """
+    Try to get a topic from curriculum, falling back to a generic lesson if the
+    categories are exhausted (the brainstorm pool refills them in the background).
+    """
     # Shuffle categories to add variety
     shuffled = categories.copy()
     random.shuffle(shuffled)
@@ -66,44 +60,293 @@ def get_topic_with_fallback(
             total = subtopic["episodes"]
             return category, topic_name, subtopic_id, subtopic, episode, total
 
-    # All categories exhausted - brainstorm new content
-    for category in shuffled:
-        new_topic = brainstorm_new_topic(gemini_client, curriculum_manager, category)
-        if new_topic and new_topic.get("subtopics"):
-            subtopic = new_topic["subtopics"][0]
-            return (
-                category,
-                new_topic["topic_name"],
-                subtopic["id"],
-                subtopic,
-                1,
-                subtopic["episodes"],
-            )
-
-    # Ultimate fallback
+    # All categories exhausted
+    print(f"No topics left in {', '.join(categories)}; using a generic lesson")
     return (
         shuffled[0],
-        "General French",
-        "fallback",
+        FALLBACK_TOPIC,
+        FALLBACK_SUBTOPIC_ID,
         {"title": "Open Discussion", "description": "Free-form lesson", "episodes": 1},
         1,
         1,
     )
 
 
-def main():
-    print("Starting L'Obsédé Daily Drill...")
+def generate_content_concurrently(generate_listening, generate_reading):
+    """
+    Run the listening and reading pipelines side by side.
+    generate_listening receives a cancel event it should honour between stages
+    and pass on to synthesis and upload, so a failure stops them mid-stage.
+    If either pipeline raises, the other is cancelled and the error propagates
+    before any progress is recorded or state is saved.
+    Returns (listening_result, reading_result).
+    """
+    cancel_event = threading.Event()
+
+    def listening(cancel_event):
+        with span("listening"):
+            return generate_listening(cancel_event)
+
+    def reading():
+        with span("reading"):
+            return generate_reading()
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    listening_future = executor.submit(propagate(listening), cancel_event)
+    reading_future = executor.submit(propagate(reading))
+
+    try:
+        done, _ = wait([listening_future, reading_future], return_when=FIRST_EXCEPTION)
+        for future in done:
+            # Re-raise the first failure, if any
+            future.result()
+        result = listening_future.result(), reading_future.result()
+    except BaseException:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    executor.shutdown(wait=True)
+    return result
+
+
+def select_training_topics(
+    curriculum_manager, state_manager, progress, allow_advanced, today_str
+) -> dict:
+    """
+    Pick today's listening and reading topics, and the reviews due today.
+    Returns {"listening": [...], "reading": [...], "reviews": [...]}: the first
+    two hold (category, topic_name, subtopic_id, subtopic, episode, total), and
+    reviews holds (category, topic_name, subtopic_id) entries, all as lists,
+    so the plan can be checkpointed as JSON and reused on resume.
+    """
+    current_chain = state_manager.get_current_chain()
+
+    # LISTENING: Check for existing chain first
+    if current_chain:
+        lit_category = current_chain["category"]
+        lit_topic = current_chain["topic_name"]
+        lit_subtopic_id = current_chain["subtopic_id"]
+        lit_episode = current_chain["current_episode"]
+        lit_total = current_chain["total_episodes"]
+        lit_subtopic_info = curriculum_manager.get_subtopic_info(
+            lit_category, lit_topic, lit_subtopic_id
+        )
+        if lit_subtopic_info:
+            lit_subtopic = lit_subtopic_info["subtopic"]
+        else:
+            # Chain info invalid (maybe curriculum changed), reset and pick new
+            state_manager.clear_current_chain()
+            current_chain = None
+
+    if not current_chain:
+        # Pick from literature or philosophy
+        (
+            lit_category,
+            lit_topic,
+            lit_subtopic_id,
+            lit_subtopic,
+            lit_episode,
+            lit_total,
+        ) = get_topic_with_fallback(
+            curriculum_manager,
+            progress,
+            LISTENING_CATEGORIES,
+            allow_advanced,
+        )
+
+    # READING: Pick from physics or mathematics (no chains, single episodes)
+    (
+        sci_category,
+        sci_topic,
+        sci_subtopic_id,
+        sci_subtopic,
+        sci_episode,
+        sci_total,
+    ) = get_topic_with_fallback(
+        curriculum_manager,
+        progress,
+        READING_CATEGORIES,
+        allow_advanced,
+    )
 
+    return {
+        "listening": [
+            lit_category,
+            lit_topic,
+            lit_subtopic_id,
+            lit_subtopic,
+            lit_episode,
+            lit_total,
+        ],
+        "reading": [
+            sci_category,
+            sci_topic,
+            sci_subtopic_id,
+            sci_subtopic,
+            sci_episode,
+            sci_total,
+        ],
+        # Today's topics are studied anyway, so they are not also reviewed
+        "reviews": [
+            list(review)
+            for review in state_manager.get_due_reviews(
+                TRAINING_REVIEWS,
+                as_of=today_str,
+                exclude=[
+                    (lit_category, lit_topic, lit_subtopic_id),
+                    (sci_category, sci_topic, sci_subtopic_id),
+                ],
+            )
+        ],
+    }
+
+
+def record_training_progress(state_manager, plan: dict):
+    """Record the plan's listening episode (continuing or ending its chain) and reading topic."""
+    lit_category, lit_topic, lit_subtopic_id, lit_subtopic, lit_episode, lit_total = plan["listening"]
+    sci_category, sci_topic, sci_subtopic_id, _, sci_episode, _ = plan["reading"]
+
+    state_manager.update_progress(lit_category, lit_topic, lit_subtopic_id, lit_episode)
+    # Update or clear chain
+    if lit_episode < lit_total:
+        state_manager.set_current_chain(
+            lit_category, lit_topic, lit_subtopic_id, lit_episode + 1, lit_total
+        )
+        print(f"Episode chain continues: {lit_episode + 1}/{lit_total} next")
+    else:
+        state_manager.clear_current_chain()
+        print(f"Episode chain completed for: {lit_subtopic['title']}")
+
+    state_manager.update_progress(sci_category, sci_topic, sci_subtopic_id, sci_episode)
+
+
+def save_day(state_manager, is_gauntlet: bool, reviews):
+    """Award the day's XP, reschedule the delivered reviews, advance the streak and save."""
+    if not is_gauntlet:
+        state_manager.increment_xp()
+    for review in reviews:
+        state_manager.record_review(*review)
+
+    state_manager.update_streak_and_date()
+    state_manager.save_state()
+
+
+def main(resume: bool = False, prefetch: bool = False, learners_dir: Optional[str] = None):
+    """
+    Run the daily drill. With resume=True, stages whose artifacts were
+    checkpointed by an earlier attempt for today are skipped.
+    With prefetch=True, tomorrow's episode is generated and uploaded into
+    tomorrow's checkpoint, but nothing is recorded; tomorrow's resumed run then
+    only records progress, adds the episode and updates the feed.
+    Every attempt, failed or not, appends a run report to RUN_HISTORY_FILE.
+    With STATE_DB set, state, curriculum and episodes are read from and
+    committed to that database in one transaction, then exported as JSON.
+    With learners_dir, every learner under it is served in one batch run
+    (see run_batch_drill).
+    """
+    print("Starting L'Obsédé Daily Drill...")
+    if learners_dir and (prefetch or STATE_DB):
+        raise ValueError("Batch runs keep learner state in JSON files and cannot prefetch; "
+                         "unset STATE_DB and drop --prefetch")
+
+    run_date = datetime.utcnow() + timedelta(days=1 if prefetch else 0)
+    today_str = run_date.strftime("%Y-%m-%d")
+    if prefetch:
+        print(f"Prefetching the episode for {today_str}")
+        # An interrupted prefetch picks up where it stopped
+        resume = True
+    checkpoint = RunCheckpoint(today_str, resume=resume, root=BATCH_RUNS_DIR if learners_dir else RUNS_DIR)
+    if checkpoint.is_complete():
+        print(f"Daily Drill for {today_str} already completed. Nothing to resume.")
+        return
+
+    trace = RunTrace(today_str, resume=resume, prefetch=prefetch)
+    store = SqliteStore(STATE_DB) if STATE_DB else None
+    try:
+        with trace.activate():
+            if store and not store.has_state():
+                # Reading an empty database would start from a blank state and
+                # curriculum, and the export would then overwrite the JSON files
+                print(f"{STATE_DB} holds no state yet; migrating the JSON files into it")
+                with span("migrate"):
+                    migrate_json(store)
+            if prefetch:
+                # Nothing is recorded, so there is nothing to commit or export
+                run_daily_drill(today_str, checkpoint, store, prefetch=True)
+                return
+            if learners_dir:
+                run_batch_drill(today_str, checkpoint, learners_dir)
+                checkpoint.mark_complete()
+                return
+            # A failed run leaves the database exactly as it found it
+            with store.transaction() if store else nullcontext():
+                run_daily_drill(today_str, checkpoint, store)
+            if store:
+                with span("export"):
+                    export_json(store)
+            checkpoint.mark_complete()
+    except BaseException as e:
+        trace.root.finish(e)
+        raise
+    finally:
+        trace.root.finish()
+        # The checkpoint copy keeps a failed attempt's report in the Actions cache
+        trace.save(RUN_HISTORY_FILE, checkpoint.path("run_report.json"))
+        print(trace.summary())
+        if store:
+            store.close()
+
+
+def stage_prefetch(checkpoint: RunCheckpoint, state_fingerprint: str, brainstorm_pool: BrainstormPool):
+    """
+    Mark a prefetched episode as ready to publish, and drop its audio (it is on
+    Drive). Brainstormed topics are staged too, as a prefetch records nothing.
+    """
+    brainstorm_pool.stage(checkpoint)
+    checkpoint.save_json(PREFETCH_FILE, {
+        "state": state_fingerprint,
+        "staged": True,
+        "staged_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    })
+    checkpoint.drop_audio()
+    print(f"Episode staged in {checkpoint.directory}; it will be published by the next run")
+
+
+def run_daily_drill(
+    today_str: str,
+    checkpoint: RunCheckpoint,
+    store: Optional[SqliteStore] = None,
+    prefetch: bool = False,
+):
+    """
+    Generate, publish and record today's episode, one traced stage at a time.
+    With prefetch=True, stop once the episode is generated and uploaded, and
+    stage it for the run that publishes it.
+    """
     # Initialize components
-    state_manager = StateManager()
-    curriculum_manager = CurriculumManager()
+    curriculum_manager = CurriculumManager(store=store)
+    state_manager = StateManager(curriculum_index=curriculum_manager.index, store=store)
     gemini_client = GeminiClient()
     drive_client = DriveClient()
     rss_generator = RSSGenerator()
-    episode_manager = EpisodeManager()
+    episode_manager = EpisodeManager(store=store)
 
     listening_agent = ListeningAgent(gemini_client, drive_client)
     reading_agent = ReadingAgent(gemini_client)
+    brainstorm_pool = BrainstormPool(gemini_client, curriculum_manager, LISTENING_CATEGORIES + READING_CATEGORIES)
+
+    # Prefetched artifacts are only valid for the state they were planned against
+    state_fingerprint = state_manager.fingerprint()
+    prefetched = checkpoint.load_json(PREFETCH_FILE)
+    if prefetched and prefetched.get("state") != state_fingerprint:
+        print("Prefetched episode was planned against an older state; generating it again")
+        listening_agent.discard_upload(checkpoint)
+        checkpoint.clear()
+    elif prefetched and prefetched.get("staged") and not prefetch:
+        print(f"Publishing the episode prefetched at {prefetched['staged_at']}")
+    if prefetch:
+        checkpoint.save_json(PREFETCH_FILE, {"state": state_fingerprint, "staged": False})
 
     # Check Gauntlet Threshold
     state_manager.check_gauntlet_entry()
@@ -112,19 +355,24 @@ def main():
     status = state_manager.get_status()
     xp = state_manager.get_xp()
     progress = state_manager.get_progress()
-    current_chain = state_manager.get_current_chain()
 
     print(f"Status: {status} | Level: {current_level} | XP: {xp}")
 
+    # Top up categories running low while today's episode is generated, unless
+    # a prefetch of this episode already did (its topics are in the checkpoint)
+    if not brainstorm_pool.staged(checkpoint):
+        brainstorm_pool.start(progress)
+
     is_gauntlet = status == "GAUNTLET"
-    today_str = datetime.utcnow().strftime("%Y-%m-%d")
 
     # Determine if we should allow advanced topics (after some XP)
     allow_advanced = xp >= 30
 
     if is_gauntlet:
-        # Gauntlet Mode: Review recent topics
-        topics_for_review = curriculum_manager.get_topics_for_review(progress, count=10)
+        # Gauntlet Mode: Review the subtopics the spaced-repetition schedule puts first
+        with span("topics", mode="gauntlet"):
+            reviews = state_manager.get_due_reviews(GAUNTLET_REVIEWS, due_only=False)
+        topics_for_review = [curriculum_manager.review_label(*review) for review in reviews]
         topics_summary = (
             ", ".join(topics_for_review) if topics_for_review else "General French"
         )
@@ -134,60 +382,55 @@ def main():
         reading_context = listening_context
         print(f"Entering GAUNTLET MODE. Reviewing: {topics_summary}")
 
-        # Generate content
-        audio_url, file_size, transcript = listening_agent.generate_episode(
-            current_level,
-            listening_context,
-            today_str,
-            is_gauntlet=True,
-            topics_summary=topics_summary,
-        )
-        essay_text = reading_agent.generate_essay(
-            current_level,
-            reading_context,
-            today_str,
-            is_gauntlet=True,
-            topics_summary=topics_summary,
+        # Generate content (listening and reading run concurrently)
+        (audio_url, file_size, transcript), essay_text = generate_content_concurrently(
+            lambda cancel_event: listening_agent.generate_episode(
+                current_level,
+                listening_context,
+                today_str,
+                is_gauntlet=True,
+                topics_summary=topics_summary,
+                cancel_event=cancel_event,
+                checkpoint=checkpoint,
+            ),
+            lambda: reading_agent.generate_essay(
+                current_level,
+                reading_context,
+                today_str,
+                is_gauntlet=True,
+                topics_summary=topics_summary,
+                checkpoint=checkpoint,
+            ),
         )
+        if prefetch:
+            stage_prefetch(checkpoint, state_fingerprint, brainstorm_pool)
+            return
     else:
         # Training Mode: Use curriculum
         print("Selecting topics from curriculum...")
 
-        # LISTENING: Check for existing chain first
-        if current_chain:
-            lit_category = current_chain["category"]
-            lit_topic = current_chain["topic_name"]
-            lit_subtopic_id = current_chain["subtopic_id"]
-            lit_episode = current_chain["current_episode"]
-            lit_total = current_chain["total_episodes"]
-            lit_subtopic_info = curriculum_manager.get_subtopic_info(
-                lit_category, lit_topic, lit_subtopic_id
-            )
-            if lit_subtopic_info:
-                lit_subtopic = lit_subtopic_info["subtopic"]
-            else:
-                # Chain info invalid (maybe curriculum changed), reset and pick new
-                state_manager.clear_current_chain()
-                current_chain = None
-
-        if not current_chain:
-            # Pick from literature or philosophy
-            (
-                lit_category,
-                lit_topic,
-                lit_subtopic_id,
-                lit_subtopic,
-                lit_episode,
-                lit_total,
-            ) = get_topic_with_fallback(
-                gemini_client,
-                curriculum_manager,
-                progress,
-                LISTENING_CATEGORIES,
-                allow_advanced,
-            )
+        plan = checkpoint.load_json("plan.json")
+        if plan:
+            print("Reusing checkpointed topic plan")
+        else:
+            with span("topics", mode="training"):
+                plan = select_training_topics(
+                    curriculum_manager,
+                    state_manager,
+                    progress,
+                    allow_advanced,
+                    today_str,
+                )
+            checkpoint.save_json("plan.json", plan)
 
-        # READING: Pick from physics or mathematics (no chains, single episodes)
+        (
+            lit_category,
+            lit_topic,
+            lit_subtopic_id,
+            lit_subtopic,
+            lit_episode,
+            lit_total,
+        ) = plan["listening"]
         (
             sci_category,
             sci_topic,
@@ -195,20 +438,20 @@ def main():
             sci_subtopic,
             sci_episode,
             sci_total,
-        ) = get_topic_with_fallback(
-            gemini_client,
-            curriculum_manager,
-            progress,
-            READING_CATEGORIES,
-            allow_advanced,
-        )
+        ) = plan["reading"]
+        # Plans checkpointed before reviews were scheduled have none
+        reviews = [tuple(review) for review in plan.get("reviews", [])]
 
-        # Format topic context for prompts
+        # Format topic context for prompts, with due reviews going to the matching medium
         listening_context = curriculum_manager.format_topic_for_prompt(
             lit_category, lit_topic, lit_subtopic, lit_episode, lit_total
+        ) + curriculum_manager.format_reviews_for_prompt(
+            [review for review in reviews if review[0] in LISTENING_CATEGORIES]
         )
         reading_context = curriculum_manager.format_topic_for_prompt(
             sci_category, sci_topic, sci_subtopic, sci_episode, sci_total
+        ) + curriculum_manager.format_reviews_for_prompt(
+            [review for review in reviews if review[0] not in LISTENING_CATEGORIES]
         )
 
         listening_topic = (
@@ -220,42 +463,36 @@ def main():
 
         print(f"Listening: {listening_topic}")
         print(f"Reading: {reading_topic}")
+        if reviews:
+            print(f"Due reviews: {', '.join(curriculum_manager.review_label(*review) for review in reviews)}")
 
         try:
-            # 1. Generate Listening (Audio -> Drive URL + Transcript)
-            audio_url, file_size, transcript = listening_agent.generate_episode(
-                current_level, listening_context, today_str
+            # 1 & 2. Generate Listening (Audio -> Drive URL + Transcript) and
+            # Reading (Essay Text) concurrently
+            (audio_url, file_size, transcript), essay_text = (
+                generate_content_concurrently(
+                    lambda cancel_event: listening_agent.generate_episode(
+                        current_level,
+                        listening_context,
+                        today_str,
+                        cancel_event=cancel_event,
+                        checkpoint=checkpoint,
+                    ),
+                    lambda: reading_agent.generate_essay(
+                        current_level,
+                        reading_context,
+                        today_str,
+                        checkpoint=checkpoint,
+                    ),
+                )
             )
             print(f"Audio available at: {audio_url} ({file_size} bytes)")
+            if prefetch:
+                stage_prefetch(checkpoint, state_fingerprint, brainstorm_pool)
+                return
 
-            # 2. Generate Reading (Essay Text)
-            essay_text = reading_agent.generate_essay(
-                current_level, reading_context, today_str
-            )
-
-            # 3. Update progress for listening topic (episode chain)
-            state_manager.update_progress(
-                lit_category, lit_topic, lit_subtopic_id, lit_episode
-            )
-
-            # Update or clear chain
-            if lit_episode < lit_total:
-                state_manager.set_current_chain(
-                    lit_category,
-                    lit_topic,
-                    lit_subtopic_id,
-                    lit_episode + 1,
-                    lit_total,
-                )
-                print(f"Episode chain continues: {lit_episode + 1}/{lit_total} next")
-            else:
-                state_manager.clear_current_chain()
-                print(f"Episode chain completed for: {lit_subtopic['title']}")
-
-            # 4. Update progress for reading topic
-            state_manager.update_progress(
-                sci_category, sci_topic, sci_subtopic_id, sci_episode
-            )
+            # 3 & 4. Update progress for the listening (episode chain) and reading topics
+            record_training_progress(state_manager, plan)
 
         except Exception as e:
             print(f"Critical Error during content generation: {e}")
@@ -263,29 +500,225 @@ def main():
 
 
     # Save Episode Metadata (transcript as podcast description, essay for reading)
-    episode_manager.add_episode(
-        date=today_str,
-        listening_topic=listening_topic,
-        reading_topic=reading_topic,
-        audio_url=audio_url,
-        description_text=transcript,
-        reading_content=essay_text,
-        file_size=file_size,
-    )
+    with span("episode_save"):
+        episode_manager.add_episode(
+            date=today_str,
+            listening_topic=listening_topic,
+            reading_topic=reading_topic,
+            audio_url=audio_url,
+            description_text=transcript,
+            reading_content=essay_text,
+            file_size=file_size,
+        )
 
-    # Update Feed
-    episodes = episode_manager.get_episodes()
-    rss_generator.generate_feed(episodes)
+    # Update Feed (only new or changed episodes are re-rendered)
+    with span("feed"):
+        rss_generator.update_feed(episode_manager)
 
     # Update State
-    if not is_gauntlet:
-        state_manager.increment_xp()
+    with span("state_save"):
+        save_day(state_manager, is_gauntlet, reviews)
+        brainstorm_pool.collect(checkpoint=checkpoint)
 
-    state_manager.update_streak_and_date()
-    state_manager.save_state()
+    if gemini_client.cache:
+        stats = gemini_client.cache.stats()
+        print(f"Gemini cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
 
     print("Daily Drill completed successfully.")
 
 
+def plan_learner(curriculum_manager, learner, today_str: str) -> dict:
+    """
+    Pick a batch learner's day: {"gauntlet": [reviews]} or the training plan
+    of select_training_topics. Reviews are not woven into training days, as
+    per-learner prompts would stop learners on the same topic sharing content.
+    """
+    state_manager = learner.state_manager
+    state_manager.check_gauntlet_entry()
+    if state_manager.get_status() == "GAUNTLET":
+        reviews = state_manager.get_due_reviews(GAUNTLET_REVIEWS, due_only=False)
+        return {"gauntlet": [list(review) for review in reviews]}
+    plan = select_training_topics(
+        curriculum_manager,
+        state_manager,
+        state_manager.get_progress(),
+        state_manager.get_xp() >= 30,
+        today_str,
+    )
+    plan["reviews"] = []
+    return plan
+
+
+def plan_units(curriculum_manager, learner, plan: dict) -> List[GenerationUnit]:
+    """The listening and reading units a learner's day needs, keyed for sharing."""
+    level = learner.state_manager.get_current_level()
+    if "gauntlet" in plan:
+        labels = [curriculum_manager.review_label(*review) for review in plan["gauntlet"]]
+        topics_summary = ", ".join(labels) if labels else "General French"
+        key = ("gauntlet", topics_summary, level)
+        return [
+            GenerationUnit(kind, key, level, f"Review topics: {topics_summary}", "THE GAUNTLET: Review",
+                           is_gauntlet=True, topics_summary=topics_summary)
+            for kind in ("listening", "reading")
+        ]
+    units = []
+    for kind in ("listening", "reading"):
+        category, topic, subtopic_id, subtopic, episode, total = plan[kind]
+        units.append(GenerationUnit(
+            kind,
+            (category, topic, subtopic_id, episode, level),
+            level,
+            curriculum_manager.format_topic_for_prompt(category, topic, subtopic, episode, total),
+            f"{topic}: {subtopic['title']} ({episode}/{total})",
+        ))
+    return units
+
+
+def generate_units(units: List[GenerationUnit], gemini_client, reading_agent,
+                   today_str: str, checkpoint: RunCheckpoint):
+    """
+    Generate every unit once, BATCH_WORKERS at a time, each checkpointed in
+    its own directory so a resumed run only redoes unfinished units.
+    The first failure cancels the rest and propagates.
+    """
+    cancel_event = threading.Event()
+
+    def generate(unit: GenerationUnit):
+        unit_checkpoint = RunCheckpoint(unit.id, resume=checkpoint.resume, root=checkpoint.path("units"))
+        with span(unit.kind, unit=unit.id, learners=len(unit.learners)):
+            if unit.kind == "listening":
+                # A Drive client's HTTP connection is not thread-safe, so each unit has its own
+                listening_agent = ListeningAgent(gemini_client, DriveClient())
+                # The unit id keeps each unit's MP3 name (and Drive lookup on resume) apart
+                unit.result = listening_agent.generate_episode(
+                    unit.level,
+                    unit.context,
+                    f"{today_str}-{unit.id}",
+                    is_gauntlet=unit.is_gauntlet,
+                    topics_summary=unit.topics_summary,
+                    cancel_event=cancel_event,
+                    checkpoint=unit_checkpoint,
+                )
+            else:
+                unit.result = reading_agent.generate_essay(
+                    unit.level,
+                    unit.context,
+                    today_str,
+                    is_gauntlet=unit.is_gauntlet,
+                    topics_summary=unit.topics_summary,
+                    checkpoint=unit_checkpoint,
+                )
+
+    executor = ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS))
+    futures = [executor.submit(propagate(generate), unit) for unit in units]
+    try:
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            # Re-raise the first failure, if any
+            future.result()
+        for future in futures:
+            future.result()
+    except BaseException:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+
+
+def run_batch_drill(today_str: str, checkpoint: RunCheckpoint, learners_dir: str):
+    """
+    Serve every learner under learners_dir in one run. Learners are planned
+    first; each unique listening episode and reading essay is then generated
+    once and fanned out to the episode store, feed and state of every learner
+    planned onto it, so generation cost follows unique content, not learners.
+    """
+    curriculum_manager = CurriculumManager()
+    gemini_client = GeminiClient()
+    reading_agent = ReadingAgent(gemini_client)
+    brainstorm_pool = BrainstormPool(gemini_client, curriculum_manager, LISTENING_CATEGORIES + READING_CATEGORIES)
+
+    learners = load_learners(learners_dir, curriculum_manager.index)
+    if not learners:
+        print(f"No learners in {learners_dir}/; nothing to do")
+        return
+
+    with span("topics", mode="batch", learners=len(learners)):
+        # Plans are checkpointed together, so a resumed run keeps every learner's topics
+        plans = checkpoint.load_json("batch_plan.json") or {}
+        for learner in learners:
+            if learner.id not in plans:
+                plans[learner.id] = plan_learner(curriculum_manager, learner, today_str)
+            else:
+                learner.state_manager.check_gauntlet_entry()
+        checkpoint.save_json("batch_plan.json", plans)
+        batch = BatchPlan()
+        for learner in learners:
+            for unit in plan_units(curriculum_manager, learner, plans[learner.id]):
+                batch.assign(learner.id, unit)
+    print(f"Batch plan: {batch.summary()}")
+
+    # Top up the curriculum for the first learner running low on it
+    for learner in learners:
+        if brainstorm_pool.start(learner.state_manager.get_progress()):
+            break
+
+    generate_units(list(batch.units.values()), gemini_client, reading_agent, today_str, checkpoint)
+
+    # Fan out; learners already published by an interrupted attempt are skipped
+    published = checkpoint.load_json("batch_published.json") or []
+    for learner in learners:
+        if learner.id in published:
+            continue
+        with span("learner", learner=learner.id):
+            plan = plans[learner.id]
+            listening = batch.assignments[learner.id]["listening"]
+            reading = batch.assignments[learner.id]["reading"]
+            audio_url, file_size, transcript = listening.result
+            learner.episode_manager.add_episode(
+                date=today_str,
+                listening_topic=listening.label,
+                reading_topic=reading.label,
+                audio_url=audio_url,
+                description_text=transcript,
+                reading_content=reading.result,
+                file_size=file_size,
+            )
+            learner.rss_generator.update_feed(learner.episode_manager)
+            is_gauntlet = "gauntlet" in plan
+            if not is_gauntlet:
+                record_training_progress(learner.state_manager, plan)
+            reviews = [tuple(review) for review in plan.get("gauntlet", [])]
+            save_day(learner.state_manager, is_gauntlet, reviews)
+        published.append(learner.id)
+        checkpoint.save_json("batch_published.json", published)
+        print(f"Published for learner {learner.id}")
+
+    with span("state_save"):
+        brainstorm_pool.collect()
+
+    if gemini_client.cache:
+        stats = gemini_client.cache.stats()
+        print(f"Gemini cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
+
+    print(f"Batch Drill completed for {len(learners)} learner(s) with {len(batch.units)} generated unit(s).")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the L'Obsédé daily drill.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse today's checkpointed artifacts and skip completed stages.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Generate and upload tomorrow's episode now, to be published by tomorrow's --resume run.",
+    )
+    parser.add_argument(
+        "--learners",
+        metavar="DIR",
+        help=f"Serve every learner under DIR (e.g. {LEARNERS_DIR}) in one batch run, generating shared content once.",
+    )
+    args = parser.parse_args()
+    main(resume=args.resume, prefetch=args.prefetch, learners_dir=args.learners)
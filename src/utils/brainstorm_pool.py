@@ -0,0 +1,139 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+from utils.curriculum_manager import CurriculumManager, normalize_topic_name
+from utils.prompts import get_brainstorm_prompt
+from utils.run_checkpoint import RunCheckpoint
+from utils.run_trace import propagate, span
+from utils.structured_output import brainstorm_batch_schema
+
+# Top up a category once fewer of its subtopics than this are left unstarted
+BRAINSTORM_THRESHOLD = int(os.environ.get("BRAINSTORM_THRESHOLD", "6"))
+# New topics asked for per low category, all categories in one request
+BRAINSTORM_BATCH = int(os.environ.get("BRAINSTORM_BATCH", "2"))
+# Seconds a publishing run waits at the end for a request still in flight
+BRAINSTORM_WAIT = float(os.environ.get("BRAINSTORM_WAIT", "60"))
+# Checkpoint file carrying a prefetch run's brainstormed topics to the run that publishes
+BRAINSTORM_FILE = "brainstorm.json"
+
+
+class BrainstormPool:
+    """
+    Keeps the curriculum stocked ahead of need. start() checks which categories
+    are running low and brainstorms topics for all of them in one background
+    request; collect() validates the results and adds them to the curriculum as
+    pending topics. All curriculum reads and writes happen on the calling
+    thread, so the background request never touches shared state.
+    A prefetch run, which records nothing, stage()s the topics in its
+    checkpoint instead, and the run publishing it collects them from there.
+    """
+
+    def __init__(self, gemini_client, curriculum_manager: CurriculumManager, categories: List[str]):
+        self.gemini_client = gemini_client
+        self.curriculum_manager = curriculum_manager
+        self.categories = categories
+        self._thread: Optional[threading.Thread] = None
+        self._result: Optional[List[Dict]] = None
+        self._error: Optional[BaseException] = None
+
+    def low_categories(self, progress: Dict) -> List[str]:
+        return [
+            category for category in self.categories
+            if self.curriculum_manager.remaining_subtopics(progress, category) < BRAINSTORM_THRESHOLD
+        ]
+
+    def start(self, progress: Dict) -> bool:
+        """Brainstorm in the background for the categories running low. Returns False if none are."""
+        low = self.low_categories(progress)
+        if not low or BRAINSTORM_BATCH <= 0:
+            return False
+        wanted = {category: BRAINSTORM_BATCH for category in low}
+        digests = {category: self.curriculum_manager.get_topic_digest(category) for category in low}
+        prompt = get_brainstorm_prompt(wanted, digests)
+        schema = brainstorm_batch_schema(low)
+        print(f"Brainstorming {BRAINSTORM_BATCH} topic(s) each for {', '.join(low)} in the background")
+
+        def run():
+            try:
+                with span("brainstorm_pool", categories=len(low)):
+                    self._result = self.gemini_client.generate_json(prompt, schema, profile="brainstorm")
+            except Exception as e:
+                self._error = e
+
+        self._thread = threading.Thread(target=propagate(run), daemon=True)
+        self._thread.start()
+        return True
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        """Wait up to timeout seconds (None: until done). True if a result came in."""
+        if self._thread is None:
+            return False
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print("Background brainstorming still running; its topics are left for a later run")
+            return False
+        self._thread = None
+        if self._error is not None:
+            print(f"Error brainstorming topics: {self._error}")
+            return False
+        return True
+
+    def staged(self, checkpoint: RunCheckpoint) -> bool:
+        """Whether a prefetch run already brainstormed for this checkpoint."""
+        return checkpoint.has(BRAINSTORM_FILE)
+
+    def stage(self, checkpoint: RunCheckpoint) -> int:
+        """
+        Wait for the request (prefetch runs are off the publish path) and keep
+        its topics in checkpoint for collect(). Returns how many were staged.
+        """
+        if not self._wait(None):
+            return 0
+        checkpoint.save_json(BRAINSTORM_FILE, self._result or [])
+        print(f"Staged {len(self._result or [])} brainstormed topic(s) for the publishing run")
+        return len(self._result or [])
+
+    def collect(self, timeout: Optional[float] = BRAINSTORM_WAIT, checkpoint: Optional[RunCheckpoint] = None) -> int:
+        """
+        Add the topics staged in checkpoint by a prefetch run, or else those of
+        this run's request once it finishes, waiting at most timeout seconds
+        (None waits for it). Returns how many topics were added.
+        """
+        if self._thread is None and checkpoint and self.staged(checkpoint):
+            result = checkpoint.load_json(BRAINSTORM_FILE)
+        elif self._wait(timeout):
+            result = self._result
+        else:
+            return 0
+
+        added = 0
+        names = {category: self.curriculum_manager.get_topic_names(category) for category in self.categories}
+        for topic_data in result or []:
+            category = topic_data.get("category")
+            problem = self.validate(topic_data, names.get(category))
+            if problem:
+                print(f"Skipping brainstormed topic {topic_data.get('topic_name')!r}: {problem}")
+                continue
+            topic_data = {key: value for key, value in topic_data.items() if key != "category"}
+            if self.curriculum_manager.add_brainstormed_topic(category, topic_data, pending=True):
+                names[category].add(normalize_topic_name(topic_data["topic_name"]))
+                added += 1
+                print(f"Added new brainstormed {category} topic: {topic_data['topic_name']}")
+        return added
+
+    @staticmethod
+    def validate(topic_data: Dict, existing_names: Optional[set]) -> Optional[str]:
+        """The reason topic_data cannot be added, or None if it can."""
+        if existing_names is None:
+            return f"unknown category {topic_data.get('category')!r}"
+        if normalize_topic_name(topic_data.get("topic_name", "")) in existing_names:
+            return "duplicates an existing topic"
+        subtopic_ids = set()
+        for subtopic in topic_data.get("subtopics", []):
+            if subtopic["id"] in subtopic_ids:
+                return f"subtopic id {subtopic['id']!r} is repeated"
+            if subtopic["episodes"] < 1:
+                return f"subtopic {subtopic['id']!r} has no episodes"
+            subtopic_ids.add(subtopic["id"])
+        return None
@@ -0,0 +1,255 @@
+import hashlib
+import heapq
+import json
+import os
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.storage import atomic_writer
+
+CURRICULUM_INDEX_FILE = "curriculum_index.json"
+# Bump when the cached layout changes, to rebuild every cached index
+CURRICULUM_INDEX_VERSION = 1
+
+SubtopicKey = Tuple[str, str]
+
+
+class IndexedSet:
+    """A set with O(1) add, remove and uniform random choice."""
+
+    def __init__(self):
+        self._items: List = []
+        self._positions: Dict = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item) -> bool:
+        return item in self._positions
+
+    def add(self, item):
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item):
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if position < len(self._items):
+            # Move the last item into the freed slot
+            self._items[position] = last
+            self._positions[last] = position
+
+    def choice(self):
+        return random.choice(self._items)
+
+
+class CategoryIndex:
+    """
+    Availability of one category's subtopics for a given progress dict.
+    Fresh (not yet started) subtopics are kept in sets for random picks;
+    in-progress ones in max-heaps on completed episodes, with stale entries
+    dropped lazily when they reach the top. Both are split by advanced.
+    """
+
+    def __init__(self, subtopics: Dict[SubtopicKey, Tuple[int, int, bool]]):
+        # (topic_name, subtopic_id) -> (position in the topic's list, episodes, advanced),
+        # shared with CurriculumIndex.subtopics
+        self.subtopics = subtopics
+        self.completed: Dict[SubtopicKey, int] = {}
+        self.fresh = {False: IndexedSet(), True: IndexedSet()}
+        self.in_progress: Dict[bool, List[Tuple[int, str, str]]] = {False: [], True: []}
+        for key, (_, _, advanced) in subtopics.items():
+            self.fresh[advanced].add(key)
+
+    def add(self, key: SubtopicKey, entry: Tuple[int, int, bool]):
+        self.remove(key)
+        self.subtopics[key] = entry
+        self.record(key, self.completed.get(key, 0))
+
+    def remove(self, key: SubtopicKey):
+        """Forget a subtopic (its heap entries go stale); its progress is kept."""
+        entry = self.subtopics.pop(key, None)
+        if entry is not None:
+            self.fresh[entry[2]].discard(key)
+
+    def record(self, key: SubtopicKey, completed: int):
+        """Move a subtopic to the set matching its completed episode count."""
+        self.completed[key] = completed
+        entry = self.subtopics.get(key)
+        if entry is None:
+            # Progress for a subtopic no longer in the curriculum
+            return
+        _, episodes, advanced = entry
+        if completed <= 0:
+            self.fresh[advanced].add(key)
+            return
+        self.fresh[advanced].discard(key)
+        if completed < episodes:
+            heapq.heappush(self.in_progress[advanced], (-completed, key[0], key[1]))
+
+    def _top_in_progress(self, advanced: bool) -> Optional[Tuple[int, str, str]]:
+        heap = self.in_progress[advanced]
+        while heap:
+            negative_completed, topic_name, subtopic_id = heap[0]
+            key = (topic_name, subtopic_id)
+            entry = self.subtopics.get(key)
+            completed = -negative_completed
+            if (entry is not None and entry[2] == advanced and self.completed.get(key) == completed
+                    and completed < entry[1]):
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def next_subtopic(self, allow_advanced: bool) -> Optional[SubtopicKey]:
+        """
+        The in-progress subtopic with the most completed episodes, else a
+        random fresh one, non-advanced first.
+        """
+        tops = [top for top in (self._top_in_progress(False),
+                                self._top_in_progress(True) if allow_advanced else None) if top]
+        if tops:
+            _, topic_name, subtopic_id = min(tops)
+            return topic_name, subtopic_id
+        if self.fresh[False]:
+            return self.fresh[False].choice()
+        if allow_advanced and self.fresh[True]:
+            return self.fresh[True].choice()
+        return None
+
+
+def index_curriculum(curriculum: Dict) -> Dict[str, Dict[SubtopicKey, Tuple[int, int, bool]]]:
+    """Map each category's (topic_name, subtopic_id) to (position, episodes, advanced)."""
+    index = {}
+    for category, topics in curriculum.items():
+        subtopics = index[category] = {}
+        for topic_name, topic_data in topics.items():
+            for key, entry in index_topic(topic_name, topic_data):
+                # The first subtopic with a given id wins, as in a linear scan
+                subtopics.setdefault(key, entry)
+    return index
+
+
+def index_topic(topic_name: str, topic_data: Dict) -> Iterable[Tuple[SubtopicKey, Tuple[int, int, bool]]]:
+    for position, subtopic in enumerate(topic_data.get("subtopics", [])):
+        yield (topic_name, subtopic["id"]), (position, subtopic["episodes"], bool(subtopic.get("advanced", False)))
+
+
+class CurriculumIndex:
+    """
+    Compiled lookup tables for a curriculum: subtopic by id, and per category
+    which subtopics are fresh, in progress or finished under a progress dict.
+    The curriculum part is cached in index_path and reused while the
+    curriculum file's mtime and size, or failing that its SHA-256, match.
+    """
+
+    def __init__(self, subtopics: Dict[str, Dict[SubtopicKey, Tuple[int, int, bool]]]):
+        self.subtopics = subtopics
+        self.categories: Dict[str, CategoryIndex] = {}
+        self._progress: Optional[Dict] = None
+
+    @staticmethod
+    def file_signature(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def load(cls, curriculum: Dict, raw: bytes, curriculum_path: str, index_path: str) -> "CurriculumIndex":
+        """The index of curriculum (whose file content is raw), from the cache when it is current."""
+        signature = list(cls.file_signature(curriculum_path)) if os.path.exists(curriculum_path) else None
+        digest = None
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == CURRICULUM_INDEX_VERSION:
+                if signature is not None and cached.get("signature") == signature:
+                    return cls._from_cache(cached)
+                digest = hashlib.sha256(raw).hexdigest()
+                if cached.get("sha256") == digest:
+                    # Same content, new mtime (e.g. a fresh checkout): refresh the fast-path key
+                    index = cls._from_cache(cached)
+                    index.save(index_path, digest, signature)
+                    return index
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        index = cls(index_curriculum(curriculum))
+        if signature is not None:
+            index.save(index_path, digest or hashlib.sha256(raw).hexdigest(), signature)
+        return index
+
+    @classmethod
+    def _from_cache(cls, cached: Dict) -> "CurriculumIndex":
+        return cls({
+            category: {(topic_name, subtopic_id): tuple(entry)
+                       for topic_name, subtopics in topics.items()
+                       for subtopic_id, entry in subtopics.items()}
+            for category, topics in cached["categories"].items()
+        })
+
+    def save(self, index_path: str, digest: str, signature: Optional[List[int]]):
+        categories: Dict[str, Dict[str, Dict]] = {}
+        for category, subtopics in self.subtopics.items():
+            topics = categories[category] = {}
+            for (topic_name, subtopic_id), entry in subtopics.items():
+                topics.setdefault(topic_name, {})[subtopic_id] = list(entry)
+        try:
+            with atomic_writer(index_path, binary=False) as f:
+                json.dump({"version": CURRICULUM_INDEX_VERSION, "signature": signature, "sha256": digest,
+                           "categories": categories}, f, ensure_ascii=False, separators=(",", ":"))
+        except OSError as e:
+            # The index is only a cache
+            print(f"Could not write curriculum index: {e}")
+
+    def position(self, category: str, topic_name: str, subtopic_id: str) -> Optional[int]:
+        entry = self.subtopics.get(category, {}).get((topic_name, subtopic_id))
+        return entry[0] if entry else None
+
+    def bind(self, progress: Dict):
+        """
+        Derive availability from progress, unless already bound to this very
+        dict (later changes to it arrive through record()).
+        """
+        if progress is self._progress:
+            return
+        self._progress = progress
+        self.categories = {}
+        for category, subtopics in self.subtopics.items():
+            category_index = self.categories[category] = CategoryIndex(subtopics)
+            for topic_name, topic_progress in progress.get(category, {}).items():
+                for subtopic_id, subtopic_progress in topic_progress.items():
+                    category_index.record((topic_name, subtopic_id),
+                                          subtopic_progress.get("completed_episodes", 0))
+
+    def record(self, progress: Dict, category: str, topic_name: str, subtopic_id: str, completed: int):
+        """Apply one progress update, if the index is bound to that progress dict."""
+        if progress is not self._progress:
+            return
+        self._category(category).record((topic_name, subtopic_id), completed)
+
+    def set_topic(self, category: str, topic_name: str, topic_data: Optional[Dict]):
+        """Re-index one topic after it is added, replaced or (with None) removed."""
+        category_index = self._category(category)
+        for key in [key for key in category_index.subtopics if key[0] == topic_name]:
+            category_index.remove(key)
+        if topic_data is None:
+            return
+        for key, entry in index_topic(topic_name, topic_data):
+            if key not in category_index.subtopics:
+                category_index.add(key, entry)
+
+    def _category(self, category: str) -> CategoryIndex:
+        if category not in self.categories:
+            self.categories[category] = CategoryIndex(self.subtopics.setdefault(category, {}))
+        return self.categories[category]
+
+    def fresh_count(self, category: str) -> int:
+        """Number of subtopics in category not started yet (bind() first)."""
+        fresh = self._category(category).fresh
+        return len(fresh[False]) + len(fresh[True])
+
+    def next_subtopic(self, category: str, allow_advanced: bool) -> Optional[SubtopicKey]:
+        if self._progress is None:
+            raise RuntimeError("CurriculumIndex.bind() must be called before picking topics")
+        return self._category(category).next_subtopic(allow_advanced)
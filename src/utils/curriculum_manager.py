@@ -1,39 +1,100 @@
+import hashlib
 import json
 import os
-import random
+import re
+import unicodedata
 from typing import Dict, List, Optional, Tuple
 
+from utils.curriculum_index import CURRICULUM_INDEX_FILE, CurriculumIndex, index_curriculum
+from utils.storage import SqliteStore, atomic_write
+
 CURRICULUM_FILE = "curriculum.json"
+# Topic names shown to the brainstorming prompt per category (the most recent ones)
+DIGEST_TOPICS = 40
+# Generic lesson for a day whose categories are exhausted; not a real subtopic,
+# so it is never recorded as progress or scheduled for review
+FALLBACK_TOPIC = "General French"
+FALLBACK_SUBTOPIC_ID = "fallback"
+
+
+def normalize_topic_name(name: str) -> str:
+    """Accent-, case- and punctuation-insensitive form of a topic name, for duplicate checks."""
+    stripped = "".join(ch for ch in unicodedata.normalize("NFKD", name) if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", stripped.casefold()).split())
 
 
 class CurriculumManager:
-    def __init__(self, filepath: str = CURRICULUM_FILE):
+    def __init__(self, filepath: str = CURRICULUM_FILE, store: Optional[SqliteStore] = None):
         self.filepath = filepath
-        self.curriculum = self._load_curriculum()
-
-    def _load_curriculum(self) -> Dict:
+        # With a store, the curriculum lives in its database instead of filepath
+        self.store = store
+        # The compiled index is cached next to the curriculum
+        self.index_path = os.path.join(os.path.dirname(filepath), CURRICULUM_INDEX_FILE)
+        self.curriculum, raw = self._load_curriculum()
+        if store:
+            self.index = CurriculumIndex(index_curriculum(self.curriculum))
+        else:
+            self.index = CurriculumIndex.load(self.curriculum, raw, self.filepath, self.index_path)
+
+    def _load_curriculum(self) -> Tuple[Dict, bytes]:
+        default = {
+            "literature": {},
+            "philosophy": {},
+            "physics": {},
+            "mathematics": {},
+        }
+        if self.store:
+            curriculum = self.store.load_curriculum()
+            for category in default:
+                curriculum.setdefault(category, {})
+            return curriculum, b""
         if not os.path.exists(self.filepath):
-            return {
-                "literature": {},
-                "philosophy": {},
-                "physics": {},
-                "mathematics": {},
-            }
-        with open(self.filepath, "r") as f:
-            return json.load(f)
+            return default, b""
+        with open(self.filepath, "rb") as f:
+            raw = f.read()
+        return json.loads(raw), raw
 
     def _save_curriculum(self):
         """Save curriculum back to file (used when brainstorming new content)."""
-        with open(self.filepath, "w") as f:
-            json.dump(self.curriculum, f, indent=2, ensure_ascii=False)
+        raw = json.dumps(self.curriculum, indent=2, ensure_ascii=False).encode("utf-8")
+        atomic_write(self.filepath, raw)
+        # Re-key the cached index to the file just written
+        self.index.save(self.index_path, hashlib.sha256(raw).hexdigest(),
+                        list(CurriculumIndex.file_signature(self.filepath)))
 
-    def get_existing_topics(self, category: str) -> str:
-        """Get list of existing topics in a category for brainstorming prompt."""
-        topics = self.curriculum.get(category, {})
-        return ", ".join(topics.keys()) if topics else "None"
+    def get_topic_names(self, category: str) -> set:
+        """Normalized names of a category's topics."""
+        return {normalize_topic_name(name) for name in self.curriculum.get(category, {})}
 
-    def add_brainstormed_topic(self, category: str, topic_data: Dict) -> bool:
-        """Add a new brainstormed topic to the curriculum."""
+    def get_topic_digest(self, category: str, limit: int = DIGEST_TOPICS) -> str:
+        """
+        Compact list of a category's topics for the brainstorming prompt: near-
+        duplicate names collapsed, and only the most recent limit shown.
+        Duplicates are rejected against the full list afterwards, so the prompt
+        stays the same size however large the curriculum grows.
+        """
+        unique: Dict[str, str] = {}
+        for name in self.curriculum.get(category, {}):
+            unique.setdefault(normalize_topic_name(name), name)
+        if not unique:
+            return "None"
+        names = list(unique.values())
+        digest = "; ".join(names[-limit:])
+        if len(names) > limit:
+            return f"({len(names)} topics in total; the {limit} most recent:) {digest}"
+        return digest
+
+    def remaining_subtopics(self, progress: Dict, category: str) -> int:
+        """Subtopics of a category not started yet under progress."""
+        self.index.bind(progress)
+        return self.index.fresh_count(category)
+
+    def add_brainstormed_topic(self, category: str, topic_data: Dict, pending: bool = False) -> bool:
+        """
+        Add a new brainstormed topic to the curriculum. Pending topics come from
+        the background pool and have not been looked at by a person yet; they are
+        playable like any other.
+        """
         try:
             topic_name = topic_data.get("topic_name")
             if not topic_name:
@@ -47,7 +108,13 @@ class CurriculumManager:
                 "subtopics": topic_data.get("subtopics", []),
                 "brainstormed": True,  # Mark as AI-generated
             }
-            self._save_curriculum()
+            if pending:
+                self.curriculum[category][topic_name]["pending"] = True
+            self.index.set_topic(category, topic_name, self.curriculum[category][topic_name])
+            if self.store:
+                self.store.save_topic(category, topic_name, self.curriculum[category][topic_name])
+            else:
+                self._save_curriculum()
             return True
         except Exception as e:
             print(f"Error adding brainstormed topic: {e}")
@@ -59,96 +126,45 @@ class CurriculumManager:
         """
         Returns (topic_name, subtopic_id, subtopic_info) for the next topic to study.
         Prioritizes continuing an existing chain, then picks new topics.
+        Availability comes from the index, bound to progress on the first call;
+        later changes to progress must go through StateManager.update_progress.
         """
-        category_curriculum = self.curriculum.get(category, {})
-        category_progress = progress.get(category, {})
-
-        # Find all available subtopics
-        available = []
-        for topic_name, topic_data in category_curriculum.items():
-            topic_progress = category_progress.get(topic_name, {})
-
-            for subtopic in topic_data.get("subtopics", []):
-                subtopic_id = subtopic["id"]
-                is_advanced = subtopic.get("advanced", False)
-
-                # Skip advanced topics if not allowed
-                if is_advanced and not allow_advanced:
-                    continue
-
-                # Check progress
-                subtopic_progress = topic_progress.get(subtopic_id, {})
-                completed_episodes = subtopic_progress.get("completed_episodes", 0)
-                total_episodes = subtopic["episodes"]
-
-                if completed_episodes < total_episodes:
-                    available.append(
-                        {
-                            "topic_name": topic_name,
-                            "subtopic_id": subtopic_id,
-                            "subtopic": subtopic,
-                            "completed": completed_episodes,
-                            "total": total_episodes,
-                            "is_advanced": is_advanced,
-                        }
-                    )
-
-        if not available:
+        self.index.bind(progress)
+        chosen = self.index.next_subtopic(category, allow_advanced)
+        if chosen is None:
             return None
-
-        # Prioritize in-progress subtopics (episode chains)
-        in_progress = [s for s in available if s["completed"] > 0]
-        if in_progress:
-            # Continue the one with most progress
-            chosen = max(in_progress, key=lambda x: x["completed"])
-        else:
-            # Start a new topic - prefer non-advanced first
-            non_advanced = [s for s in available if not s["is_advanced"]]
-            pool = non_advanced if non_advanced else available
-            chosen = random.choice(pool)
-
-        return (chosen["topic_name"], chosen["subtopic_id"], chosen["subtopic"])
+        topic_name, subtopic_id = chosen
+        position = self.index.position(category, topic_name, subtopic_id)
+        subtopic = self.curriculum[category][topic_name]["subtopics"][position]
+        return topic_name, subtopic_id, subtopic
 
     def get_subtopic_info(
         self, category: str, topic_name: str, subtopic_id: str
     ) -> Optional[Dict]:
         """Get detailed info about a specific subtopic."""
-        category_curriculum = self.curriculum.get(category, {})
-        topic_data = category_curriculum.get(topic_name, {})
-
-        for subtopic in topic_data.get("subtopics", []):
-            if subtopic["id"] == subtopic_id:
-                return {
-                    "topic_name": topic_name,
-                    "topic_description": topic_data.get("description", ""),
-                    "subtopic": subtopic,
-                }
-        return None
-
-    def get_topics_for_review(self, progress: Dict, count: int = 10) -> List[str]:
-        """Get recently completed subtopics for gauntlet review."""
-        completed = []
-
-        for category, topics in progress.items():
-            for topic_name, topic_progress in topics.items():
-                for subtopic_id, subtopic_data in topic_progress.items():
-                    if subtopic_data.get("completed_episodes", 0) > 0:
-                        completed.append(
-                            {
-                                "category": category,
-                                "topic": topic_name,
-                                "subtopic_id": subtopic_id,
-                                "last_studied": subtopic_data.get(
-                                    "last_studied", "1970-01-01"
-                                ),
-                            }
-                        )
-
-        # Sort by last studied (most recent first) and take top N
-        completed.sort(key=lambda x: x["last_studied"], reverse=True)
-        return [
-            f"{item['topic']} - {item['subtopic_id']}" for item in completed[:count]
-        ]
+        position = self.index.position(category, topic_name, subtopic_id)
+        if position is None:
+            return None
+        topic_data = self.curriculum[category][topic_name]
+        return {
+            "topic_name": topic_name,
+            "topic_description": topic_data.get("description", ""),
+            "subtopic": topic_data["subtopics"][position],
+        }
+
+    def review_label(self, category: str, topic_name: str, subtopic_id: str) -> str:
+        """Human-readable name of a subtopic due for review."""
+        info = self.get_subtopic_info(category, topic_name, subtopic_id)
+        return f"{topic_name} - {info['subtopic']['title'] if info else subtopic_id}"
+
+    def format_reviews_for_prompt(self, reviews: List[Tuple[str, str, str]]) -> str:
+        """Prompt note asking to weave earlier subtopics due for spaced review into today's episode."""
+        if not reviews:
+            return ""
+        labels = "; ".join(self.review_label(*review) for review in reviews)
+        return f"""
+SPACED REVIEW: Briefly recall and connect to these earlier subtopics, which are due for review: {labels}
+"""
 
     def format_topic_for_prompt(
         self,
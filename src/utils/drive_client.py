@@ -1,89 +1,296 @@
+import hashlib
+import json
 import os
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from utils.run_trace import span
+from utils.storage import atomic_writer
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.http import MediaUpload
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
+# Resumable upload chunks must be a multiple of 256KB
+STREAM_CHUNK_SIZE = 4 * 256 * 1024
+# Access tokens are cached here until they expire (about an hour), so repeated runs skip the
+# OAuth refresh. This only helps local runs and reruns: the scheduled workflows start 12 hours
+# apart on fresh runners, so the file is deliberately kept out of the Actions cache, where a
+# live token would otherwise sit
+TOKEN_CACHE_FILE = os.environ.get("GOOGLE_TOKEN_CACHE", "content/drive_token.json")
+# Metadata returned by create/list calls, so publishing needs no extra files().get
+FILE_FIELDS = 'id, webContentLink, webViewLink, size'
+# Drive v3 discovery document, vendored so building the client never fetches it
+DISCOVERY_DOCUMENT = os.path.join(os.path.dirname(__file__), "discovery", "drive.v3.json")
+# Overrides the API root (e.g. http://127.0.0.1:8081/) so benchmarks can run against a local stand-in
+DRIVE_API_ROOT = os.environ.get("GOOGLE_DRIVE_API_ROOT")
+
 
 class DriveClient:
-    def __init__(self):
+    """
+    Google Drive uploads. The API client (and the Google client libraries) is
+    loaded on first use, so runs that never upload pay neither the import
+    time nor any OAuth request.
+    """
+
+    def __init__(self, token_cache: str = TOKEN_CACHE_FILE):
         self.client_id = os.environ.get("GOOGLE_CLIENT_ID")
         self.client_secret = os.environ.get("GOOGLE_CLIENT_SECRET")
         self.refresh_token = os.environ.get("GOOGLE_REFRESH_TOKEN")
         self.folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+        self.token_cache = token_cache
+        self._service = None
+        self._initialized = False
 
         if not all([self.client_id, self.client_secret, self.refresh_token]):
             print("Warning: OAuth credentials not fully configured.")
             print("Required: GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REFRESH_TOKEN")
-            self.service = None
-            return
+            self._initialized = True
 
-        try:
-            creds = Credentials(
-                token=None,
-                refresh_token=self.refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                scopes=SCOPES
-            )
+    @property
+    def service(self):
+        """Drive API client, built on first access (None if unavailable)."""
+        if not self._initialized:
+            self._initialized = True
+            try:
+                from googleapiclient.discovery import build_from_document
+                with open(DISCOVERY_DOCUMENT, 'r') as f:
+                    discovery = json.load(f)
+                if DRIVE_API_ROOT:
+                    discovery["rootUrl"] = DRIVE_API_ROOT
+                    discovery["baseUrl"] = DRIVE_API_ROOT + discovery["servicePath"]
+                with span("drive.connect"):
+                    self._service = build_from_document(discovery, credentials=self._credentials())
+            except Exception as e:
+                print(f"Error initializing Drive Client: {e}")
+                self._service = None
+        return self._service
+
+    def _token_cache_key(self) -> str:
+        """Identifies the OAuth client and grant a cached token belongs to."""
+        return hashlib.sha256(f"{self.client_id}:{self.refresh_token}".encode("utf-8")).hexdigest()
+
+    def _credentials(self) -> "Credentials":
+        """Credentials with a valid access token, from the token cache or an OAuth refresh."""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+
+        creds = Credentials(
+            token=None,
+            refresh_token=self.refresh_token,
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=SCOPES
+        )
+        cached = self._load_cached_token()
+        if cached:
+            creds.token = cached["token"]
+            creds.expiry = datetime.fromisoformat(cached["expiry"])
+        if not creds.valid:
             # Refresh to get a valid access token
             creds.refresh(Request())
-            self.service = build('drive', 'v3', credentials=creds)
-        except Exception as e:
-            print(f"Error initializing Drive Client: {e}")
-            self.service = None
+            self._save_cached_token(creds)
+        return creds
+
+    def _load_cached_token(self) -> Optional[dict]:
+        try:
+            with open(self.token_cache, 'r') as f:
+                cached = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if cached.get("key") != self._token_cache_key() or not cached.get("expiry"):
+            return None
+        return cached
 
-    def upload_file(self, filepath: str, filename: str) -> str:
+    def _save_cached_token(self, creds: "Credentials"):
+        if not creds.expiry:
+            return
+        try:
+            # The temp file, and so the cache, is readable by the owner only
+            with atomic_writer(self.token_cache, binary=False) as f:
+                json.dump({
+                    "key": self._token_cache_key(),
+                    "token": creds.token,
+                    "expiry": creds.expiry.isoformat(),
+                }, f)
+        except OSError as e:
+            # The cache only saves a refresh next time; never fail the run over it
+            print(f"Warning: could not cache Drive access token: {e}")
+
+    def upload_file(self, filepath: str, filename: str) -> tuple:
         """
         Uploads a file to the configured Google Drive folder.
-        Returns the webContentLink (direct download link).
+        Returns (webContentLink, file_size, file_id).
+        """
+        if not self.service:
+            print("Drive service not initialized. Skipping upload.")
+            return "http://mock-drive-url.com/file.mp3", 0, None
+
+        from googleapiclient.http import MediaFileUpload
+
+        media = MediaFileUpload(filepath, resumable=True)
+        return self._upload_media(media, filename)
+
+    def upload_stream(self, stream, filename: str, mimetype: str = "audio/mpeg") -> tuple:
+        """
+        Uploads a readable stream (e.g. a subprocess pipe) chunk by chunk as it
+        is produced, without staging it on disk.
+        Returns (webContentLink, file_size, file_id).
         """
         if not self.service:
             print("Drive service not initialized. Skipping upload.")
-            return "http://mock-drive-url.com/file.mp3", 0
+            # Drain the stream so the producer is not blocked on a full pipe
+            file_size = 0
+            while True:
+                data = stream.read(STREAM_CHUNK_SIZE)
+                if not data:
+                    break
+                file_size += len(data)
+            return "http://mock-drive-url.com/file.mp3", file_size, None
+
+        from utils.stream_upload import StreamMediaUpload
 
+        media = StreamMediaUpload(stream, mimetype)
+        return self._upload_media(media, filename)
+
+    def _upload_media(self, media: "MediaUpload", filename: str) -> tuple:
+        """Create the Drive file from a resumable media body and make it public."""
         file_metadata = {
             'name': filename,
             'parents': [self.folder_id] if self.folder_id else []
         }
 
-        media = MediaFileUpload(filepath, resumable=True)
-
         try:
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id',
-                supportsAllDrives=True
-            ).execute()
+            with span("drive.upload", file=filename) as upload_span:
+                file = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields=FILE_FIELDS,
+                    supportsAllDrives=True
+                ).execute()
+                upload_span.add(bytes_out=int(file.get('size', 0)))
+
+            print(f"File ID: {file.get('id')}")
+            return self._publish(file)
+
+        except Exception as e:
+            print(f"Error uploading to Drive: {e}")
+            raise
 
-            file_id = file.get('id')
-            print(f"File ID: {file_id}")
+    def _publish(self, file: dict) -> tuple:
+        """Make the file public and return (webContentLink, file_size, file_id) from its metadata."""
+        self._share_publicly([file['id']])
+        return self._describe(file)
 
-            # Make public (Anyone with link can read)
-            self.service.permissions().create(
+    @staticmethod
+    def _describe(file: dict) -> tuple:
+        # webContentLink is for downloading/streaming
+        url = file.get('webContentLink') or file.get('webViewLink')
+        return url, int(file.get('size', 0)), file['id']
+
+    def _share_publicly(self, file_ids: List[str]):
+        """Grant "anyone with the link" read access, in one batch request for several files."""
+        def permission(file_id):
+            return self.service.permissions().create(
                 fileId=file_id,
                 body={'type': 'anyone', 'role': 'reader'},
                 fields='id',
                 supportsAllDrives=True
-            ).execute()
+            )
 
-            # Get the webContentLink
-            result = self.service.files().get(
-                fileId=file_id,
-                fields='webContentLink, webViewLink, size',
-                supportsAllDrives=True
-            ).execute()
+        with span("drive.share", files=len(file_ids)):
+            if len(file_ids) == 1:
+                permission(file_ids[0]).execute()
+                return
 
-            # webContentLink is for downloading/streaming
-            url = result.get('webContentLink') or result.get('webViewLink')
-            file_size = int(result.get('size', 0))
-            
-            return url, file_size
+            errors = []
 
-        except Exception as e:
-            print(f"Error uploading to Drive: {e}")
-            raise
\ No newline at end of file
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    errors.append(exception)
+
+            batch = self.service.new_batch_http_request(callback=callback)
+            for file_id in file_ids:
+                batch.add(permission(file_id))
+            batch.execute()
+            if errors:
+                raise errors[0]
+
+    def get_upload(self, file_id: str) -> Optional[tuple]:
+        """
+        Return (webContentLink, file_size, file_id) for a file this app uploaded
+        and published earlier, or None if it has since been deleted or trashed.
+        """
+        if not self.service:
+            return None
+
+        from googleapiclient.errors import HttpError
+
+        try:
+            with span("drive.get", file=file_id):
+                file = self.service.files().get(
+                    fileId=file_id,
+                    fields=f'{FILE_FIELDS}, trashed',
+                    supportsAllDrives=True
+                ).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return None
+            raise
+        if file.get('trashed'):
+            return None
+        return self._describe(file)
+
+    def delete_upload(self, file_id: str) -> bool:
+        """
+        Delete a file this app uploaded, e.g. the audio of a discarded attempt,
+        so no later lookup by name can return it. Returns False if it could
+        not be deleted; a file already gone counts as deleted.
+        """
+        if not self.service:
+            return False
+
+        from googleapiclient.errors import HttpError
+
+        try:
+            with span("drive.delete", file=file_id):
+                self.service.files().delete(fileId=file_id, supportsAllDrives=True).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return True
+            print(f"Warning: could not delete Drive file {file_id}: {e}")
+            return False
+        print(f"Deleted Drive file {file_id}")
+        return True
+
+    def find_upload(self, filename: str) -> Optional[tuple]:
+        """
+        Look for a file this app already uploaded under filename (e.g. by an
+        earlier attempt for the same date) and return (webContentLink, file_size, file_id).
+        If there are several, the newest is taken: an older one may belong to a
+        discarded attempt (see delete_upload).
+        Resumable uploads only create the file once complete, so a match is whole.
+        """
+        if not self.service:
+            return None
+
+        query = f"name = '{filename}' and trashed = false"
+        if self.folder_id:
+            query += f" and '{self.folder_id}' in parents"
+        with span("drive.find", file=filename):
+            result = self.service.files().list(
+                q=query,
+                fields=f'files({FILE_FIELDS})',
+                orderBy='createdTime desc',
+                pageSize=1,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute()
+
+        files = result.get('files', [])
+        if not files:
+            return None
+        print(f"Found existing Drive upload for {filename}: {files[0]['id']}")
+        return self._publish(files[0])
@@ -1,41 +1,172 @@
+import hashlib
 import json
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from utils.reader_manifest import ReaderManifest
+from utils.storage import SqliteStore, atomic_writer
+
+EPISODES_DIR = "episodes"
+INDEX_FILE = "index.json"
+# Single-file store used before episodes were sharded; migrated on first load
+LEGACY_EPISODES_FILE = "episodes.json"
+
+# Small per-episode fields kept in the index; everything else lives in the body file
+INDEX_FIELDS = ("listening_topic", "reading_topic", "audio_url", "file_size")
 
-EPISODES_FILE = "episodes.json"
 
 class EpisodeManager:
-    def __init__(self, filepath: str = EPISODES_FILE):
-        self.filepath = filepath
-        self.episodes = self._load_episodes()
-
-    def _load_episodes(self) -> List[Dict]:
-        if not os.path.exists(self.filepath):
-            return []
-        with open(self.filepath, 'r') as f:
+    """
+    Episode store with one JSON file per episode (episodes/<date>.json) and a
+    small index keyed by date (episodes/index.json).
+    Adding an episode writes its own file and the index entry, so the cost of
+    a daily save does not grow with the archive. Bodies are loaded lazily.
+    Each added episode is also published to the /read/ manifest.
+    With a store, the index and bodies are rows of its database instead.
+    """
+
+    def __init__(self, directory: str = EPISODES_DIR, legacy_filepath: str = LEGACY_EPISODES_FILE,
+                 reader_manifest: Optional[ReaderManifest] = None, store: Optional[SqliteStore] = None):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.reader_manifest = reader_manifest or ReaderManifest()
+        self.store = store
+        self._bodies: Dict[str, Dict] = {}
+        if store:
+            self.index = store.load_episode_index()
+        else:
+            if not os.path.exists(self.index_path) and os.path.exists(legacy_filepath):
+                self.migrate_legacy(legacy_filepath)
+            self.index = self._load_index()
+            if any("content_hash" not in entry for entry in self.index.values()):
+                self._backfill_content_hashes()
+        if self.index and not self.reader_manifest.exists():
+            self.publish_reader_manifest()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, 'r') as f:
             try:
                 return json.load(f)
             except json.JSONDecodeError:
-                return []
+                return {}
+
+    def _write_json(self, path: str, data):
+        """Write JSON via a temp file so readers never see a half-written file."""
+        with atomic_writer(path, binary=False) as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
 
-    def save_episodes(self):
-        with open(self.filepath, 'w') as f:
-            json.dump(self.episodes, f, indent=2)
+    def _episode_filename(self, date: str) -> str:
+        return f"{date}.json"
+
+    def save_index(self):
+        self._write_json(self.index_path, self.index)
+
+    def _save_body(self, episode: Dict):
+        date = episode["date"]
+        self._write_json(os.path.join(self.directory, self._episode_filename(date)), episode)
+        self._bodies[date] = episode
+
+    def _decode_reading_content(self, reading_content):
+        """Store structured reading content as JSON rather than a JSON-encoded string."""
+        if isinstance(reading_content, str):
+            try:
+                return json.loads(reading_content)
+            except json.JSONDecodeError:
+                return reading_content
+        return reading_content
 
     def add_episode(self, date: str, listening_topic: str, reading_topic: str,
                    audio_url: str, description_text: str, reading_content: str = "", file_size: int = 0):
+        """Insert or replace the episode for date (a rerun never duplicates a day)."""
         episode = {
             "date": date,
             "listening_topic": listening_topic,
             "reading_topic": reading_topic,
             "audio_url": audio_url,
             "description": description_text,
-            "reading_content": reading_content,
+            "reading_content": self._decode_reading_content(reading_content),
             "file_size": file_size
         }
-        # Prepend to list (newest first)
-        self.episodes.insert(0, episode)
-        self.save_episodes()
+        entry = self._index_entry(episode)
+        if self.store:
+            # One row holds both, so the body and its index entry cannot disagree
+            self.store.save_episode(episode, entry)
+            self._bodies[date] = episode
+            self.index[date] = entry
+        else:
+            self._save_body(episode)
+            self.index[date] = entry
+            self.save_index()
+        self.reader_manifest.publish(episode)
+
+    def _content_hash(self, episode: Dict) -> str:
+        """Hash of an episode body, so consumers (e.g. the feed) can tell when it changed."""
+        canonical = json.dumps(episode, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _index_entry(self, episode: Dict) -> Dict:
+        entry = {field: episode.get(field) for field in INDEX_FIELDS}
+        entry["path"] = self._episode_filename(episode["date"])
+        entry["content_hash"] = self._content_hash(episode)
+        return entry
+
+    def _backfill_content_hashes(self):
+        """Add content hashes to index entries written before they were tracked."""
+        for date in self.index:
+            if "content_hash" not in self.index[date]:
+                self.index[date] = self._index_entry(self.get_episode(date))
+        self.save_index()
+
+    def get_dates(self) -> List[str]:
+        """Episode dates, newest first."""
+        return sorted(self.index, reverse=True)
+
+    def get_index(self) -> Dict[str, Dict]:
+        return self.index
+
+    def get_episode(self, date: str) -> Optional[Dict]:
+        """Load one episode body on demand."""
+        if date not in self.index:
+            return None
+        if date not in self._bodies and self.store:
+            self._bodies[date] = self.store.load_episode(date)
+        elif date not in self._bodies:
+            path = os.path.join(self.directory, self.index[date]["path"])
+            with open(path, 'r') as f:
+                self._bodies[date] = json.load(f)
+        return self._bodies[date]
 
     def get_episodes(self) -> List[Dict]:
-        return self.episodes
+        """All episodes, newest first (loads every body)."""
+        return [self.get_episode(date) for date in self.get_dates()]
+
+    def publish_reader_manifest(self):
+        """(Re)build the /read/ manifest and payloads for every stored episode."""
+        for date in sorted(self.index):
+            self.reader_manifest.publish(self.get_episode(date))
+        print(f"Published {len(self.index)} episode(s) to {self.reader_manifest.directory}/")
+
+    def migrate_legacy(self, legacy_filepath: str = LEGACY_EPISODES_FILE):
+        """Split a legacy episodes.json list into per-episode files plus the index, then remove it."""
+        with open(legacy_filepath, 'r') as f:
+            try:
+                episodes = json.load(f)
+            except json.JSONDecodeError:
+                episodes = []
+
+        index = {}
+        # Legacy list is newest first; walk oldest first so the newest copy of a date wins
+        for episode in reversed(episodes):
+            if not episode.get("date"):
+                continue
+            episode = dict(episode)
+            episode["reading_content"] = self._decode_reading_content(episode.get("reading_content", ""))
+            self._save_body(episode)
+            index[episode["date"]] = self._index_entry(episode)
+
+        self.index = index
+        self.save_index()
+        os.remove(legacy_filepath)
+        print(f"Migrated {len(index)} episode(s) from {legacy_filepath} to {self.directory}/")
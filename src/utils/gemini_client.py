@@ -1,37 +1,264 @@
 import base64
+import hashlib
+import io
+import json
 import os
+import queue
+import shutil
+import tempfile
+import threading
 import time
-from typing import Dict, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
 
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from utils.generation_profiles import GenerationProfile, hedge_delay, resolve_profile
+from utils.prompts import get_repair_prompt
+from utils.rate_limiter import RateLimiter, estimate_tokens, is_daily_quota_exhausted, retry_delay
+from utils.response_cache import ResponseCache
+from utils.run_trace import Span, current_span, propagate, span, start_span
+from utils.storage import atomic_writer
+from utils.structured_output import (SchemaError, format_path, parse_json, repair_target, schema_errors, set_path,
+                                     subschema)
+from utils.tts_planner import TTS_MAX_CHUNK_SECONDS, estimate_turn_seconds, plan_chunks
+
+# Maximum number of TTS chunks synthesized in parallel
+TTS_MAX_CONCURRENCY = int(os.environ.get("TTS_MAX_CONCURRENCY", "3"))
+# PCM buffered in memory per chunk before spilling to a temp file
+TTS_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Overridable so benchmarks can run against a local stand-in
+GEMINI_API_BASE_URL = os.environ.get("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+# Attempts per request, and the first backoff (doubled each retry) when the server gives no Retry-After
+GEMINI_MAX_ATTEMPTS = 4
+RETRY_BACKOFF_SECONDS = 2.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Broken parts of a structured response re-asked for before giving up
+MAX_JSON_REPAIRS = 5
+
+
+def chunk_checkpoint_name(chunk: List[Dict[str, str]], model: str) -> str:
+    """Checkpoint file name for a TTS chunk's PCM, derived from its turns and model."""
+    canonical = json.dumps([model, chunk], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return f"chunk_{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]}.pcm"
+
+
+def _check_cancelled(cancel_event: Optional[threading.Event]):
+    if cancel_event is not None and cancel_event.is_set():
+        raise RuntimeError("GeminiClient: audio synthesis cancelled")
 
 
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None):
         self.api_key = os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             print("Warning: GEMINI_API_KEY environment variable is not set")
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
-        
-        # Create session with retry logic
+        self.base_url = GEMINI_API_BASE_URL
+
+        # Retries and rate limiting are handled per request by _post_stream
         self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=2,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["POST"],
+
+        # Optional on-disk response cache (enabled via GEMINI_CACHE_DIR)
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+
+    def generate_content(self, prompt: str, model: Optional[str] = None, profile: Optional[str] = None,
+                         validate: Optional[Callable[[str], bool]] = None, schema: Optional[Dict] = None) -> str:
+        """
+        Return the full response text, generated with the named profile's settings
+        (see utils/generation_profiles.py), or the model given.
+        With a schema, the model is asked for JSON matching it (responseSchema).
+        With a hedged profile, a backup request is sent if no valid result has
+        arrived within the profile's hedge delay, and the first valid result wins.
+        If no result passes validate, the first complete one is returned.
+        """
+        settings = resolve_profile(profile, model)
+
+        def attempt(model: str, cancel: threading.Event) -> Optional[str]:
+            pieces = []
+            stream = self._stream_attempt(prompt, settings, model, schema, accept=validate)
+            try:
+                for piece in stream:
+                    if cancel.is_set():
+                        return None
+                    pieces.append(piece)
+            finally:
+                stream.close()
+            return "".join(pieces)
+
+        return self._race(settings, attempt, validate)
+
+    def stream_content(self, prompt: str, model: Optional[str] = None,
+                       profile: Optional[str] = None, schema: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Yield the response text piece by piece as the model streams it.
+        With a hedged profile, a backup request is sent if the first piece has
+        not arrived within the hedge delay; the first stream to produce one is used.
+        """
+        settings = resolve_profile(profile, model)
+
+        def attempt(model: str, cancel: threading.Event) -> tuple:
+            stream = self._stream_attempt(prompt, settings, model, schema)
+            return next(stream, None), stream
+
+        first, stream = self._race(
+            settings, attempt,
+            validate=lambda started: started[0] is not None,
+            discard=lambda started: started[1].close(),
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
+        if first is None:
+            return
+        yield first
+        yield from stream
+
+    def generate_json(self, prompt: str, schema: Dict, model: Optional[str] = None,
+                      profile: Optional[str] = None) -> Any:
+        """
+        Generate a JSON document constrained to schema and validate it.
+        Broken parts are re-asked for one at a time (see repair_json) rather
+        than regenerating the whole document.
+        Raises ValueError if the response is not JSON, SchemaError if it cannot be repaired.
+        """
+        def is_valid(text: str) -> bool:
+            return not schema_errors(parse_json(text), schema)
+
+        text = self.generate_content(prompt, model=model, profile=profile, validate=is_valid, schema=schema)
+        return self.repair_json(prompt, parse_json(text), schema)
+
+    def repair_json(self, prompt: str, document: Any, schema: Dict) -> Any:
+        """Fix each broken part of document in place via repair_part, up to MAX_JSON_REPAIRS parts."""
+        for _ in range(MAX_JSON_REPAIRS + 1):
+            errors = schema_errors(document, schema)
+            if not errors:
+                return document
+            target = repair_target(errors[0][0])
+            if not target:
+                break
+            problems = [f"{format_path(path)}: {problem}" for path, problem in errors
+                        if path[:len(target)] == target]
+            set_path(document, target, self.repair_part(prompt, document, target, problems, subschema(schema, target)))
+        raise SchemaError(f"Response still fails its schema: {schema_errors(document, schema)[:3]}")
+
+    def repair_part(self, prompt: str, document: Any, path: tuple, problems: List[str], schema: Dict) -> Any:
+        """Re-ask for only the part of document at path, returning a value that matches schema."""
+        print(f"Repairing {format_path(path)} of structured response: {'; '.join(problems[:3])}")
+        repair_prompt = get_repair_prompt(
+            prompt, json.dumps(document, ensure_ascii=False, indent=2), format_path(path), problems
+        )
+        with span("json_repair", path=format_path(path)):
+            text = self.generate_content(
+                repair_prompt, profile="json_repair", schema=schema,
+                validate=lambda text: not schema_errors(parse_json(text), schema),
+            )
+        value = parse_json(text)
+        errors = schema_errors(value, schema)
+        if errors:
+            raise SchemaError(f"Repair of {format_path(path)} still fails its schema: {errors[:3]}")
+        return value
+
+    def _race(self, settings: GenerationProfile, attempt: Callable[[str, threading.Event], Any],
+              validate: Optional[Callable[[Any], bool]] = None,
+              discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Run attempt(model, cancel_event) for the profile, hedging with one backup
+        attempt if the primary has not produced a valid result within the hedge
+        delay (or has already failed). Returns the first valid result; results
+        that lose are passed to discard. Raises the first error if every attempt fails.
+        """
+        delay = hedge_delay(settings)
+        with span("generation", profile=settings.name, model=settings.model) as race_span:
+            if delay is None:
+                return attempt(settings.model, threading.Event())
+
+            results = queue.Queue()
+            cancels = []
+
+            def launch(model: str):
+                index = len(cancels)
+                cancel = threading.Event()
+                cancels.append(cancel)
+
+                def run():
+                    try:
+                        results.put((index, attempt(model, cancel), None))
+                    except Exception as e:
+                        results.put((index, None, e))
+
+                threading.Thread(target=propagate(run), daemon=True).start()
+
+            def is_valid(result) -> bool:
+                try:
+                    return result is not None and (validate is None or bool(validate(result)))
+                except Exception:
+                    return False
+
+            def hedge(reason: str):
+                print(f"Hedging {settings.name} generation ({reason})")
+                race_span.set(hedged=reason)
+                launch(settings.hedge_model or settings.model)
+
+            launch(settings.model)
+            finished, fallback, errors = 0, None, []
+            while finished < len(cancels):
+                try:
+                    index, result, error = results.get(timeout=delay if len(cancels) == 1 else None)
+                except queue.Empty:
+                    hedge(f"no result after {delay:.1f}s")
+                    continue
+                finished += 1
+                if error is None and is_valid(result):
+                    race_span.set(winner=index)
+                    for cancel in cancels:
+                        cancel.set()
+                    self._discard_late_results(results, len(cancels) - finished, discard)
+                    if fallback is not None and discard:
+                        discard(fallback)
+                    return result
+                if error is not None:
+                    errors.append(error)
+                elif fallback is None:
+                    fallback = result
+                elif discard and result is not None:
+                    discard(result)
+                if len(cancels) == 1:
+                    hedge("primary failed" if error is not None else "primary result invalid")
+
+            if fallback is not None:
+                return fallback
+            raise errors[0]
 
-    def generate_content(self, prompt: str, model: str = "gemini-3-pro-preview") -> str:
+    def _discard_late_results(self, results: queue.Queue, pending: int, discard: Optional[Callable[[Any], None]]):
+        """Hand results of attempts that lost the race to discard as they arrive."""
+        if not pending or not discard:
+            return
+
+        def drain():
+            for _ in range(pending):
+                _, result, error = results.get()
+                if error is None and result is not None:
+                    discard(result)
+
+        threading.Thread(target=drain, daemon=True).start()
+
+    @staticmethod
+    def _accepted(accept: Optional[Callable[[str], bool]], text: str) -> bool:
+        try:
+            return accept is None or bool(accept(text))
+        except Exception:
+            return False
+
+    def _stream_attempt(self, prompt: str, settings: GenerationProfile, model: str,
+                        schema: Optional[Dict] = None,
+                        accept: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        """
+        Stream one generation request with the profile's settings on the given model.
+        With accept, only a response it passes is cached or replayed from the
+        cache, so a backup attempt or a rerun asks the model again.
+        """
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is missing")
 
-        url = f"{self.base_url}/{model}:streamGenerateContent?key={self.api_key}"
-
         payload = {
             "contents": [
                 {
@@ -41,53 +268,139 @@ class GeminiClient:
             ],
             "generationConfig": {
                 "thinkingConfig": {
-                    "thinkingLevel": "HIGH",
+                    "thinkingLevel": settings.thinking_level,
                 }
             },
-            "tools": [
+        }
+        if schema:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+            payload["generationConfig"]["responseSchema"] = schema
+        if settings.google_search:
+            payload["tools"] = [
                 {
                     "googleSearch": {}
                 }
             ]
-        }
-
-        response = self.session.post(url, json=payload, timeout=120)
-        response.raise_for_status()
 
+        # Not made current: the caller consumes this generator between yields
+        trace = start_span("gemini.generate", model=model)
         try:
-            data = response.json()
-            full_text = ""
-            candidates_list = []
-
-            if isinstance(data, list):
-                for chunk in data:
-                    if "candidates" in chunk:
-                        candidates_list.extend(chunk["candidates"])
-            else:
-                if "candidates" in data:
-                    candidates_list.extend(data["candidates"])
-
-            for candidate in candidates_list:
-                if "content" in candidate and "parts" in candidate["content"]:
-                    for part in candidate["content"]["parts"]:
-                        full_text += part.get("text", "")
-
-            return full_text
+            cache_key = self.cache.key(model, payload) if self.cache else None
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None and self._accepted(accept, cached.decode("utf-8")):
+                    trace.set(cached=True)
+                    trace.add(bytes_in=len(cached))
+                    yield cached.decode("utf-8")
+                    return
+
+            with self._post_stream(model, payload, prompt, settings.timeout, trace) as response:
+                pieces = []
+                try:
+                    for event in self._iter_sse_events(response, trace):
+                        for candidate in event.get("candidates", []):
+                            for part in candidate.get("content", {}).get("parts", []):
+                                text = part.get("text", "")
+                                if text:
+                                    pieces.append(text)
+                                    yield text
+                except (ValueError, KeyError) as e:
+                    print(f"Error parsing Gemini response: {e}")
+                    raise
+
+            text = "".join(pieces)
+            if cache_key and self._accepted(accept, text):
+                self.cache.put(cache_key, text.encode("utf-8"))
         except Exception as e:
-            print(f"Error parsing Gemini response: {e}")
+            trace.finish(e)
             raise
+        finally:
+            trace.finish()
+
+    @contextmanager
+    def _post_stream(self, model: str, payload: Dict, prompt: str, timeout: float,
+                     trace: Span) -> Iterator[requests.Response]:
+        """
+        POST a streamGenerateContent request through the model's shared
+        RateLimiter and yield the open streaming response.
+        429s pause every caller of the model for the server's Retry-After (or
+        RetryInfo) delay; 5xx and connection errors back off exponentially.
+        The in-flight slot is held until the block exits.
+        """
+        url = f"{self.base_url}/{model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        limiter = RateLimiter.for_model(model)
+        tokens = estimate_tokens(prompt)
+        ticket = limiter.ticket()
+
+        for attempt in range(GEMINI_MAX_ATTEMPTS):
+            with limiter.request(tokens, ticket) as waited:
+                if waited >= 0.01:
+                    trace.add(rate_limit_wait=round(waited, 2))
+                try:
+                    response = self.session.post(url, json=payload, timeout=timeout, stream=True)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error, delay = e, None
+                else:
+                    trace.add(bytes_out=len(response.request.body or b""))
+                    if response.status_code not in RETRYABLE_STATUS:
+                        with response:
+                            response.raise_for_status()
+                            limiter.succeeded()
+                            yield response
+                        return
+                    with response:
+                        delay = retry_delay(response)
+                        if response.status_code == 429:
+                            if is_daily_quota_exhausted(response):
+                                response.raise_for_status()
+                            # Waiting happens in limiter.request, shared with every other caller
+                            limiter.throttled(delay if delay is not None else RETRY_BACKOFF_SECONDS * 2 ** attempt)
+                            delay = 0.0
+                        error = requests.exceptions.HTTPError(
+                            f"{response.status_code} from {model}", response=response
+                        )
 
-    def _chunk_script(self, script: List[Dict[str, str]], max_turns_per_chunk: int = 20) -> List[List[Dict[str, str]]]:
-        """Split script into smaller chunks for TTS processing."""
-        chunks = []
-        for i in range(0, len(script), max_turns_per_chunk):
-            chunks.append(script[i:i + max_turns_per_chunk])
-        return chunks
+            if attempt == GEMINI_MAX_ATTEMPTS - 1:
+                print(f"Gemini request to {model} failed after {GEMINI_MAX_ATTEMPTS} attempts")
+                raise error
+            if delay is None:
+                delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+            trace.add(retries=1)
+            wait = f"in {delay:.0f}s" if delay else "after the rate-limit pause"
+            print(f"Gemini request to {model} failed (attempt {attempt + 1}/{GEMINI_MAX_ATTEMPTS}), "
+                  f"retrying {wait}: {error}")
+            time.sleep(delay)
 
-    def _generate_audio_chunk(self, script_chunk: List[Dict[str, str]], model: str) -> bytes:
-        """Generate audio for a single chunk of the script."""
-        url = f"{self.base_url}/{model}:streamGenerateContent?key={self.api_key}"
+    def _iter_sse_events(self, response: requests.Response, trace: Optional[Span] = None) -> Iterator[Dict]:
+        """
+        Yield each JSON event of a streamGenerateContent?alt=sse response as it arrives.
+        The size of each event is added to trace's bytes_in.
+        Lines are decoded as UTF-8 here: text/event-stream carries no charset,
+        so requests would otherwise fall back to ISO-8859-1 and garble accents.
+        """
+        for line in response.iter_lines():
+            if line and line.startswith(b"data:"):
+                if trace is not None:
+                    trace.add(bytes_in=len(line))
+                yield json.loads(line[len(b"data:"):].decode("utf-8"))
 
+    def _chunk_script(self, script: Iterable[Dict[str, str]],
+                      max_chunk_seconds: float = TTS_MAX_CHUNK_SECONDS) -> Iterator[List[Dict[str, str]]]:
+        """
+        Split script into chunks of similar estimated speaking time for TTS.
+        Works on any iterable of turns, yielding each chunk as soon as it is
+        planned, so a script still being streamed can be synthesized incrementally.
+        """
+        return plan_chunks(script, max_chunk_seconds)
+
+    def _generate_audio_chunk(self, script_chunk: List[Dict[str, str]], model: str, sink: BinaryIO,
+                              cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Generate audio for a single chunk of the script.
+        PCM is decoded part by part from the SSE stream and written to sink.
+        If cancel_event is set, the stream is abandoned at the next event.
+        Returns the number of bytes written.
+        """
         # Build structured prompt with director's notes for better TTS control
         director_notes = """# AUDIO PROFILES
 
@@ -148,60 +461,150 @@ Acteur: Native French (Parisian) accent. Speak French passages at authentic nati
         }
 
 
-        # TTS with retry logic for connection errors
-        max_retries = 3
-        for attempt in range(max_retries):
+        start_pos = sink.tell()
+        cache_key = self.cache.key(model, payload) if self.cache else None
+        if cache_key:
+            cached = self.cache.open(cache_key)
+            if cached is not None:
+                with cached:
+                    shutil.copyfileobj(cached, sink)
+                current_span().set(cached=True)
+                return sink.tell() - start_pos
+
+        # _post_stream retries failed requests; this loop retries streams broken
+        # mid-way. The sink is rewound so no duplicate audio is left behind.
+        trace = current_span()
+        for attempt in range(GEMINI_MAX_ATTEMPTS):
+            response = None
             try:
-                response = self.session.post(url, json=payload, timeout=180)
-                response.raise_for_status()
-                break
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                if attempt < max_retries - 1:
-                    wait_time = 10 * (attempt + 1)
-                    print(f"TTS chunk request failed (attempt {attempt + 1}/{max_retries}), retrying in {wait_time}s: {e}")
+                with self._post_stream(model, payload, full_prompt_text, 180, trace) as response:
+                    written = self._write_audio_stream(response, sink, trace, cancel_event)
+                if cache_key:
+                    # Store the chunk by reading back what was just written
+                    end_pos = sink.tell()
+                    sink.seek(start_pos)
+                    self.cache.put_stream(cache_key, sink)
+                    sink.seek(end_pos)
+                return written
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if response is None:
+                    # The request itself failed, already retried by _post_stream
+                    raise
+                sink.seek(start_pos)
+                sink.truncate()
+                if attempt < GEMINI_MAX_ATTEMPTS - 1:
+                    trace.add(retries=1)
+                    wait_time = RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    print(f"TTS chunk stream broke (attempt {attempt + 1}/{GEMINI_MAX_ATTEMPTS}), retrying in {wait_time:.0f}s: {e}")
                     time.sleep(wait_time)
                 else:
-                    print(f"TTS chunk request failed after {max_retries} attempts")
+                    print(f"TTS chunk stream failed after {GEMINI_MAX_ATTEMPTS} attempts")
                     raise
 
-        audio_data = b""
+    def _write_audio_stream(self, response: requests.Response, sink: BinaryIO,
+                            trace: Optional[Span] = None,
+                            cancel_event: Optional[threading.Event] = None) -> int:
+        """Decode every inlineData part of an SSE audio response straight into sink."""
+        written = 0
         try:
-            data = response.json()
-            candidates_list = []
-            if isinstance(data, list):
-                for chunk in data:
-                    if "candidates" in chunk:
-                        candidates_list.extend(chunk["candidates"])
-            else:
-                if "candidates" in data:
-                    candidates_list.extend(data["candidates"])
-
-            for candidate in candidates_list:
-                if "content" in candidate and "parts" in candidate["content"]:
-                    for part in candidate["content"]["parts"]:
+            for event in self._iter_sse_events(response, trace):
+                _check_cancelled(cancel_event)
+                for candidate in event.get("candidates", []):
+                    for part in candidate.get("content", {}).get("parts", []):
                         if "inlineData" in part:
-                            audio_data += base64.b64decode(part["inlineData"]["data"])
-
-            return audio_data
-        except Exception as e:
+                            written += sink.write(base64.b64decode(part["inlineData"]["data"]))
+            return written
+        except (ValueError, KeyError) as e:
             print(f"Error parsing Gemini Audio chunk response: {e}")
             raise
 
-    def generate_audio(self, script: List[Dict[str, str]], model: str = "gemini-2.5-pro-preview-tts") -> bytes:
+    def generate_audio_to(self, script: Iterable[Dict[str, str]], sink: BinaryIO,
+                          model: str = "gemini-2.5-pro-preview-tts",
+                          max_concurrency: int = TTS_MAX_CONCURRENCY,
+                          chunk_dir: Optional[str] = None,
+                          cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Synthesize the script chunk by chunk on a bounded worker pool and
+        write the PCM to sink in script order.
+        script may be a list or a lazy iterable of turns (e.g. a script still
+        being streamed): each chunk is submitted as soon as it is complete.
+        Each chunk streams into its own spooled buffer (spilling to disk past
+        TTS_SPOOL_MAX_BYTES) and is copied to sink as soon as every earlier
+        chunk has been written, so peak memory does not grow with episode length.
+        If chunk_dir is given, each chunk's PCM is checkpointed there under a
+        hash of its turns and model (see chunk_checkpoint_name), and chunks
+        already present are reused instead of re-synthesized. A chunk is only
+        reused for exactly the turns it was made from, so a regenerated script
+        or a different chunk plan never splices in stale audio.
+        If cancel_event is set, no further chunk is started, requests in flight
+        are abandoned and RuntimeError is raised.
+        Returns the number of bytes written.
+        """
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is missing")
 
-        # Split script into chunks to avoid TTS timeout issues
-        chunks = self._chunk_script(script, max_turns_per_chunk=20)
-        print(f"Generating audio in {len(chunks)} chunk(s)...")
+        workers = max(1, max_concurrency)
+        print(f"Generating audio with {workers} worker(s)...")
+
+        def synthesize(i, chunk):
+            seconds = sum(estimate_turn_seconds(turn) for turn in chunk)
+            _check_cancelled(cancel_event)
+            with span("tts.chunk", index=i, turns=len(chunk), estimated_seconds=round(seconds, 1)) as chunk_span:
+                chunk_path = os.path.join(chunk_dir, chunk_checkpoint_name(chunk, model)) if chunk_dir else None
+                if chunk_path and os.path.exists(chunk_path):
+                    print(f"Reusing checkpointed chunk {i + 1}")
+                    chunk_span.set(checkpointed=True)
+                    return open(chunk_path, "rb")
+
+                print(f"Processing chunk {i + 1} ({len(chunk)} turns, ~{seconds:.0f}s)...")
+                spool = tempfile.SpooledTemporaryFile(max_size=TTS_SPOOL_MAX_BYTES)
+                try:
+                    self._generate_audio_chunk(chunk, model, spool, cancel_event)
+                    if chunk_path:
+                        spool.seek(0)
+                        self._write_checkpoint(chunk_path, spool)
+                except BaseException:
+                    spool.close()
+                    raise
+                spool.seek(0)
+                return spool
+
+        written = 0
+        pending = deque()
+
+        def drain(block: bool):
+            # Copy finished chunks to sink in submission (= script) order
+            nonlocal written
+            while pending and (block or pending[0].done()):
+                with pending.popleft().result() as spool:
+                    shutil.copyfileobj(spool, sink)
+                    written += spool.tell()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                # Split script into duration-balanced chunks to avoid TTS timeouts
+                for i, chunk in enumerate(self._chunk_script(script)):
+                    _check_cancelled(cancel_event)
+                    pending.append(executor.submit(propagate(synthesize), i, chunk))
+                    drain(block=False)
+                drain(block=True)
+                _check_cancelled(cancel_event)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return written
 
-        all_audio_data = b""
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i + 1}/{len(chunks)} ({len(chunk)} turns)...")
-            chunk_audio = self._generate_audio_chunk(chunk, model)
-            all_audio_data += chunk_audio
-            # Small delay between chunks to avoid rate limiting
-            if i < len(chunks) - 1:
-                time.sleep(2)
+    def _write_checkpoint(self, path: str, stream: BinaryIO):
+        """Copy stream to path via a temp file, so a present file is always complete."""
+        with atomic_writer(path) as f:
+            shutil.copyfileobj(stream, f)
 
-        return all_audio_data
\ No newline at end of file
+    def generate_audio(self, script: List[Dict[str, str]], model: str = "gemini-2.5-pro-preview-tts",
+                       max_concurrency: int = TTS_MAX_CONCURRENCY) -> bytes:
+        """Synthesize the script and return the PCM as bytes (see generate_audio_to)."""
+        buffer = io.BytesIO()
+        self.generate_audio_to(script, buffer, model=model, max_concurrency=max_concurrency)
+        return buffer.getvalue()
@@ -0,0 +1,95 @@
+import json
+import os
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+from utils.run_trace import RUN_HISTORY_FILE
+
+DEFAULT_MODEL = "gemini-3-pro-preview"
+# Set to 0 to never send backup requests
+GEMINI_HEDGING = os.environ.get("GEMINI_HEDGING", "1") != "0"
+# Latencies from this many recent runs feed each profile's p95
+HISTORY_RUNS = 30
+# Below this many samples, the profile's latency_slo is used instead of the p95
+MIN_SAMPLES = 5
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Request settings for one kind of text generation.
+    A backup request (on hedge_model if set) is sent once the latency (time to
+    the first piece for streams, to a valid result otherwise) passes the
+    profile's p95 over recent runs, so only the slowest few percent are hedged.
+    latency_slo stands in for the p95 until enough runs are recorded; None
+    disables hedging.
+    """
+    name: str
+    model: str = DEFAULT_MODEL
+    thinking_level: str = "HIGH"
+    google_search: bool = True
+    # Per-request timeout (connect and between streamed bytes), in seconds
+    timeout: float = 120
+    latency_slo: Optional[float] = None
+    hedge_model: Optional[str] = None
+
+
+PROFILES: Dict[str, GenerationProfile] = {
+    profile.name: profile
+    for profile in [
+        GenerationProfile("listening_script", latency_slo=60),
+        GenerationProfile("reading_essay", latency_slo=90),
+        # A curriculum outline needs neither deep thinking nor search
+        GenerationProfile("brainstorm", thinking_level="LOW", google_search=False, latency_slo=30,
+                          hedge_model="gemini-3-flash-preview"),
+        # Re-asks for one broken part of a structured response
+        GenerationProfile("json_repair", thinking_level="LOW", google_search=False, timeout=60, latency_slo=20),
+    ]
+}
+
+
+def resolve_profile(profile: Optional[str] = None, model: Optional[str] = None) -> GenerationProfile:
+    """The named profile (or an unhedged default), with its model overridden if one is given."""
+    resolved = PROFILES[profile] if profile else GenerationProfile("default")
+    return replace(resolved, model=model) if model else resolved
+
+
+def _generation_latencies(spans: List[Dict], profile: str, into: List[float]):
+    for span in spans:
+        if span.get("name") == "generation" and span.get("profile") == profile and not span.get("error"):
+            into.append(span["seconds"])
+        _generation_latencies(span.get("children", []), profile, into)
+
+
+def recent_latencies(profile: str, history_path: str = RUN_HISTORY_FILE) -> List[float]:
+    """Latencies of the profile's generations in the last HISTORY_RUNS run reports."""
+    try:
+        with open(history_path, "r", encoding="utf-8") as f:
+            lines = deque(f, maxlen=HISTORY_RUNS)
+    except OSError:
+        return []
+    latencies: List[float] = []
+    for line in lines:
+        try:
+            _generation_latencies(json.loads(line).get("spans", []), profile, latencies)
+        except (ValueError, AttributeError):
+            continue
+    return latencies
+
+
+_hedge_delays: Dict[str, Optional[float]] = {}
+
+
+def hedge_delay(profile: GenerationProfile) -> Optional[float]:
+    """Seconds to wait for the primary request before hedging (None: never hedge)."""
+    if not GEMINI_HEDGING or profile.latency_slo is None:
+        return None
+    if profile.name not in _hedge_delays:
+        latencies = sorted(recent_latencies(profile.name))
+        delay = profile.latency_slo
+        if len(latencies) >= MIN_SAMPLES:
+            # Never capped at the SLO: a profile that is routinely slower would hedge every request
+            delay = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        _hedge_delays[profile.name] = delay
+    return _hedge_delays[profile.name]
@@ -0,0 +1,71 @@
+import json
+import os
+from typing import Dict
+
+from utils.curriculum_manager import CURRICULUM_FILE, CurriculumManager
+from utils.episode_manager import EPISODES_DIR, INDEX_FILE, EpisodeManager
+from utils.state_manager import STATE_FILE, StateManager
+from utils.storage import SqliteStore, write_json_atomic
+
+
+def migrate_json(store: SqliteStore, root: str = ".") -> Dict[str, int]:
+    """
+    Copy curriculum.json, user_state.json and the episodes/ store under root
+    into store, in one transaction. Returns how many rows of each were written.
+    """
+    state_manager = StateManager(os.path.join(root, STATE_FILE))
+    curriculum_manager = CurriculumManager(os.path.join(root, CURRICULUM_FILE))
+    episode_manager = EpisodeManager(os.path.join(root, EPISODES_DIR))
+
+    progress = state_manager.get_progress()
+    progress_rows = [(category, topic_name, subtopic_id, entry)
+                     for category, topics in progress.items()
+                     for topic_name, subtopics in topics.items()
+                     for subtopic_id, entry in subtopics.items()]
+    topics = [(category, topic_name, topic_data)
+              for category, category_topics in curriculum_manager.curriculum.items()
+              for topic_name, topic_data in category_topics.items()]
+    index = episode_manager.get_index()
+
+    with store.transaction():
+        store.save_state(state_manager.state, progress_rows)
+        for category, topic_name, topic_data in topics:
+            store.save_topic(category, topic_name, topic_data)
+        # Oldest first, like the daily runs that created them
+        for date in sorted(index):
+            store.save_episode(episode_manager.get_episode(date), index[date])
+    return {"progress": len(progress_rows), "topics": len(topics), "episodes": len(index)}
+
+
+def export_json(store: SqliteStore, root: str = ".") -> int:
+    """
+    Regenerate curriculum.json, user_state.json and the episodes/ store under
+    root from store, for the committed copy and GitHub Pages. Episode files
+    whose content hash is unchanged are left alone. Returns how many episode
+    files were written.
+    Raises ValueError if store holds no state, rather than overwriting the
+    files with a blank state and an empty curriculum.
+    """
+    if not store.has_state():
+        raise ValueError(f"{store.path} holds no state; migrate the JSON files into it before exporting")
+    write_json_atomic(os.path.join(root, STATE_FILE), StateManager(store=store).state)
+    write_json_atomic(os.path.join(root, CURRICULUM_FILE), CurriculumManager(store=store).curriculum)
+
+    directory = os.path.join(root, EPISODES_DIR)
+    index_path = os.path.join(directory, INDEX_FILE)
+    try:
+        with open(index_path, "r") as f:
+            exported = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        exported = {}
+
+    index = store.load_episode_index()
+    written = 0
+    for date, entry in index.items():
+        path = os.path.join(directory, entry["path"])
+        if exported.get(date, {}).get("content_hash") == entry["content_hash"] and os.path.exists(path):
+            continue
+        write_json_atomic(path, store.load_episode(date))
+        written += 1
+    write_json_atomic(index_path, index)
+    return written
@@ -0,0 +1,95 @@
+import json
+from typing import Iterable, Iterator, List
+
+
+class InvalidJson:
+    """An array element whose brackets balance but whose text does not decode."""
+
+    def __init__(self, text: str, error: json.JSONDecodeError):
+        self.text = text
+        self.error = error
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally parse a top-level JSON array of objects/arrays.
+    Text is fed in arbitrary pieces (e.g. streamed model output, possibly
+    wrapped in markdown fences) and each element is returned as soon as its
+    closing bracket arrives.
+    With keep_invalid, an element that does not decode is returned as
+    InvalidJson instead of raising, so the caller can repair just that element.
+    """
+
+    def __init__(self, keep_invalid: bool = False):
+        self.keep_invalid = keep_invalid
+        self._started = False
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item: List[str] = []
+
+    def feed(self, text: str) -> List:
+        """Consume a piece of text and return the elements it completed."""
+        items = []
+        for ch in text:
+            if self.done:
+                break
+
+            if not self._started:
+                # Skip anything (e.g. a ```json fence) before the array opens
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._item.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 1:
+                if ch in "{[":
+                    self._item = [ch]
+                    self._depth += 1
+                elif ch == "]":
+                    self.done = True
+                elif ch not in ", \t\r\n":
+                    raise ValueError(f"Unexpected character {ch!r} between array elements")
+                continue
+
+            self._item.append(ch)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    items.append(self._decode("".join(self._item)))
+                    self._item = []
+        return items
+
+    def _decode(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            if not self.keep_invalid:
+                raise
+            return InvalidJson(text, e)
+
+
+def iter_json_array(chunks: Iterable[str], keep_invalid: bool = False) -> Iterator:
+    """Yield the elements of a streamed JSON array as they complete."""
+    parser = JsonArrayStreamParser(keep_invalid)
+    for chunk in chunks:
+        # Keep draining after the array closes so the source can finish cleanly
+        if not parser.done:
+            yield from parser.feed(chunk)
+    if not parser.done:
+        raise ValueError("Stream ended before the JSON array was closed")
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from utils.curriculum_index import CurriculumIndex
+from utils.episode_manager import EPISODES_DIR, LEGACY_EPISODES_FILE, EpisodeManager
+from utils.reader_manifest import READER_DATA_DIR, ReaderManifest
+from utils.rss_generator import BASE_URL, RSSGenerator
+from utils.run_checkpoint import RUNS_DIR
+from utils.state_manager import STATE_FILE, StateManager
+
+# One subdirectory per learner, each with its own state, episode store, reader data and feed
+LEARNERS_DIR = "learners"
+# Batch runs checkpoint apart from single-learner runs of the same day
+BATCH_RUNS_DIR = os.path.join(RUNS_DIR, "batch")
+# Unique listening/reading units generated at once in a batch run
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "2"))
+
+
+class Learner:
+    """
+    One learner's workspace, <learners_dir>/<learner_id>/, laid out like the
+    repository root of a single-learner run (user_state.json, episodes/,
+    read/data/, feed.xml, transcripts/) and served under the same path.
+    """
+
+    def __init__(self, learner_id: str, directory: str, curriculum_index: Optional[CurriculumIndex] = None,
+                 base_url: str = BASE_URL):
+        self.id = learner_id
+        self.directory = directory
+        self.state_manager = StateManager(os.path.join(directory, STATE_FILE), curriculum_index=curriculum_index)
+        self.episode_manager = EpisodeManager(
+            os.path.join(directory, EPISODES_DIR),
+            legacy_filepath=os.path.join(directory, LEGACY_EPISODES_FILE),
+            reader_manifest=ReaderManifest(os.path.join(directory, READER_DATA_DIR)),
+        )
+        self.rss_generator = RSSGenerator(directory, base_url)
+
+
+def load_learners(learners_dir: str = LEARNERS_DIR, curriculum_index: Optional[CurriculumIndex] = None,
+                  base_url: str = BASE_URL) -> List[Learner]:
+    """Every learner under learners_dir, by id; an empty subdirectory is a new learner."""
+    if not os.path.isdir(learners_dir):
+        return []
+    site_path = learners_dir.strip("/").replace(os.sep, "/")
+    return [
+        Learner(name, os.path.join(learners_dir, name), curriculum_index, f"{base_url}/{site_path}/{name}")
+        for name in sorted(os.listdir(learners_dir))
+        if os.path.isdir(os.path.join(learners_dir, name)) and not name.startswith(".")
+    ]
+
+
+class GenerationUnit:
+    """
+    A listening episode or reading essay generated once and shared by every
+    learner planned onto it. Learners share a unit when they are on the same
+    key: (category, topic, subtopic, episode, level) on training days, or the
+    same review list and level in the Gauntlet.
+    """
+
+    def __init__(self, kind: str, key: Tuple, level: str, context: str, label: str,
+                 is_gauntlet: bool = False, topics_summary: str = ""):
+        self.kind = kind
+        self.key = key
+        self.level = level
+        self.context = context
+        self.label = label
+        self.is_gauntlet = is_gauntlet
+        self.topics_summary = topics_summary
+        # Stable across attempts, so a resumed run finds the unit's checkpoint
+        canonical = json.dumps([kind, *key], ensure_ascii=False, separators=(",", ":"))
+        self.id = f"{kind}-{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]}"
+        self.learners: List[str] = []
+        # (drive_url, file_size, transcript) for listening, the essay text for reading
+        self.result = None
+
+
+class BatchPlan:
+    """Today's generation units, deduplicated by key, and the units each learner gets."""
+
+    def __init__(self):
+        self.units: Dict[Tuple, GenerationUnit] = {}
+        # learner id -> {"listening": unit, "reading": unit}
+        self.assignments: Dict[str, Dict[str, GenerationUnit]] = {}
+
+    def assign(self, learner_id: str, unit: GenerationUnit) -> GenerationUnit:
+        """Give learner_id the unit with unit's key, reusing one already planned."""
+        unit = self.units.setdefault((unit.kind, unit.key), unit)
+        unit.learners.append(learner_id)
+        self.assignments.setdefault(learner_id, {})[unit.kind] = unit
+        return unit
+
+    def summary(self) -> str:
+        return (f"{len(self.assignments)} learner(s), {len(self.units)} unique unit(s) "
+                f"for {sum(len(unit.learners) for unit in self.units.values())} assignment(s)")
@@ -167,50 +167,83 @@ QUESTIONS DE VIE OU DE MORT
 """
 
 
-def get_brainstorm_prompt(category: str, existing_topics: str) -> str:
-    """Generate a prompt to brainstorm new curriculum content when curriculum runs out."""
+def get_brainstorm_prompt(wanted: dict, digests: dict) -> str:
+    """
+    Prompt to brainstorm new curriculum topics for several categories in one request.
+    wanted maps category to the number of topics to create; digests maps category
+    to a compact summary of the topics it already has.
+    """
     category_descriptions = {
         "literature": "Classical French Literature (novels, plays, poetry from French authors)",
         "philosophy": "French Philosophy (existentialism, enlightenment, postmodernism, ethics)",
         "physics": "Physics concepts explained in French",
         "mathematics": "Mathematics concepts explained in French",
     }
-    cat_desc = category_descriptions.get(category, category)
+    sections = "\n".join(
+        f"""
+Category "{category}": {category_descriptions.get(category, category)}
+Create {count} NEW topic(s). Existing topics (DO NOT repeat these or close variants):
+{digests[category]}"""
+        for category, count in wanted.items()
+    )
 
     return f"""
 You are a curriculum designer for French language learning.
-Category: {cat_desc}
+{sections}
 
-Existing topics already in curriculum (DO NOT repeat these):
-{existing_topics}
-
-Task: Create a NEW topic with subtopics for the curriculum.
-
-Output Format (JSON ONLY):
-{{
-    "topic_name": "Name of the work/concept in French",
-    "description": "Brief English description of the topic",
-    "subtopics": [
-        {{
-            "id": "unique-id-1",
-            "title": "Subtopic title in French",
-            "episodes": 2,
-            "description": "What this subtopic covers"
-        }},
-        {{
-            "id": "unique-id-2",
-            "title": "Another subtopic",
-            "episodes": 3,
-            "description": "What this covers"
-        }}
-    ]
-}}
+Output Format (JSON ONLY): an array with one object per new topic, e.g.
+[
+    {{
+        "category": "{next(iter(wanted))}",
+        "topic_name": "Name of the work/concept in French",
+        "description": "Brief English description of the topic",
+        "subtopics": [
+            {{
+                "id": "unique-id-1",
+                "title": "Subtopic title in French",
+                "episodes": 2,
+                "description": "What this subtopic covers"
+            }},
+            {{
+                "id": "unique-id-2",
+                "title": "Another subtopic",
+                "episodes": 3,
+                "description": "What this covers",
+                "advanced": true
+            }}
+        ]
+    }}
+]
 
 Guidelines:
 - For literature: Choose a specific French literary work (novel, play, collection)
 - For philosophy: Choose a specific philosopher or philosophical movement
 - For physics/math: Choose a coherent topic area
+- Topics in the same category must be distinct from each other
 - Each topic should have 3-6 subtopics
 - Each subtopic should have 2-4 episodes
+- Subtopic ids must be unique across all topics
 - Include one "advanced" subtopic for deeper exploration
 """
+
+
+def get_repair_prompt(original_prompt: str, document: str, path: str, problems: list) -> str:
+    """Ask for a corrected version of one broken part of a structured response."""
+    problem_lines = "\n".join(f"- {problem}" for problem in problems)
+    return f"""
+You produced the JSON document below for this task:
+
+--- TASK ---
+{original_prompt}
+--- END TASK ---
+
+--- DOCUMENT ---
+{document}
+--- END DOCUMENT ---
+
+The part at `{path}` is broken:
+{problem_lines}
+
+Return ONLY a corrected value for `{path}`, consistent with the rest of the document
+and the task's rules. Do not return the rest of the document.
+"""
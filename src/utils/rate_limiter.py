@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Optional
+
+import requests
+
+# Per-model quotas as {"<model>": {"rpm": ..., "tpm": ...}}, merged over MODEL_LIMITS
+RATE_LIMITS_ENV = os.environ.get("GEMINI_RATE_LIMITS", "")
+# Upper bound on concurrent in-flight requests per model
+GEMINI_MAX_IN_FLIGHT = int(os.environ.get("GEMINI_MAX_IN_FLIGHT", "8"))
+# Requests and input tokens per minute, per model (tpm counts estimated input tokens)
+DEFAULT_LIMITS = {"rpm": 60, "tpm": 1_000_000}
+MODEL_LIMITS = {
+    "gemini-3-pro-preview": {"rpm": 25, "tpm": 1_000_000},
+    "gemini-2.5-pro-preview-tts": {"rpm": 10, "tpm": 100_000},
+}
+# Rough characters per token, for estimating a prompt's token count
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse a google.protobuf.Duration string such as "17s" or "0.5s"."""
+    try:
+        return float(value.rstrip("s"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def retry_delay(response: requests.Response) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, from the Retry-After header (seconds
+    or HTTP date) or the RetryInfo detail of a Google API error body.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    for detail in _error_details(response):
+        if detail.get("@type", "").endswith("google.rpc.RetryInfo"):
+            return _parse_duration(detail.get("retryDelay"))
+    return None
+
+
+def is_daily_quota_exhausted(response: requests.Response) -> bool:
+    """True if a 429 is for a per-day quota, which no amount of waiting within the run will lift."""
+    for detail in _error_details(response):
+        for violation in detail.get("violations", []):
+            if "PerDay" in violation.get("quotaId", ""):
+                return True
+    return False
+
+
+def _error_details(response: requests.Response) -> list:
+    try:
+        return response.json().get("error", {}).get("details", [])
+    except (ValueError, AttributeError):
+        return []
+
+
+class TokenBucket:
+    """Refills per_minute units evenly over a minute. Not thread-safe: RateLimiter holds its lock."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (amounts above capacity wait for a full bucket)."""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Process-wide admission control for one model: requests-per-minute and
+    tokens-per-minute buckets, a shared cool-down set by Retry-After, and an
+    adaptive in-flight limit that halves on every 429 and grows back by one
+    after as many successes as the current limit (AIMD).
+    Requests are admitted in ticket order, so a retry keeps its place ahead
+    of requests that arrived after it.
+    Shared by every GeminiClient and thread in the process via for_model().
+    """
+
+    _registry: Dict[str, "RateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, rpm: int, tpm: int, max_in_flight: int = GEMINI_MAX_IN_FLIGHT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight_limit = self.max_in_flight
+        self.in_flight = 0
+        self.successes = 0
+        self.cooldown_until = 0.0
+        self._tickets = itertools.count()
+        self._waiting: list = []
+        self._condition = threading.Condition()
+
+    @classmethod
+    def for_model(cls, model: str) -> "RateLimiter":
+        with cls._registry_lock:
+            limiter = cls._registry.get(model)
+            if limiter is None:
+                limits = dict(DEFAULT_LIMITS)
+                limits.update(MODEL_LIMITS.get(model, {}))
+                if RATE_LIMITS_ENV:
+                    limits.update(json.loads(RATE_LIMITS_ENV).get(model, {}))
+                limiter = cls._registry[model] = cls(limits["rpm"], limits["tpm"])
+            return limiter
+
+    def ticket(self) -> int:
+        """A place in the admission queue; pass the same ticket to every attempt of a request."""
+        return next(self._tickets)
+
+    @contextmanager
+    def request(self, tokens: int, ticket: Optional[int] = None) -> Iterator[float]:
+        """
+        Hold an in-flight slot for the duration of the block, once every older
+        ticket has been admitted, the cool-down has passed and both buckets
+        allow the request. Yields the seconds waited.
+        """
+        if ticket is None:
+            ticket = self.ticket()
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] == ticket and self.in_flight < self.in_flight_limit:
+                        wait = max(self.cooldown_until - now,
+                                   self.requests.wait_time(1, now),
+                                   self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            break
+                    else:
+                        # Woken when a slot is released or an older ticket is admitted
+                        wait = None
+                    self._condition.wait(wait)
+            finally:
+                # Leave the queue even if interrupted, so younger tickets are not stuck behind it
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+        try:
+            yield time.monotonic() - started
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def succeeded(self):
+        with self._condition:
+            self.successes += 1
+            if self.successes >= self.in_flight_limit and self.in_flight_limit < self.max_in_flight:
+                self.in_flight_limit += 1
+                self.successes = 0
+                self._condition.notify_all()
+
+    def throttled(self, delay: float):
+        """Record a 429: pause every caller for delay seconds and halve the in-flight limit."""
+        with self._condition:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+            self.in_flight_limit = max(1, self.in_flight_limit // 2)
+            self.successes = 0
+            # The server is the authority on quota: start the buckets over empty
+            self.requests.level = min(self.requests.level, 0.0)
+            self.tokens.level = min(self.tokens.level, 0.0)
+            self._condition.notify_all()
@@ -0,0 +1,74 @@
+import json
+import os
+from typing import Dict, List
+
+from utils.storage import atomic_writer
+
+READER_DATA_DIR = "read/data"
+MANIFEST_FILE = "manifest.json"
+MONTHS_DIR = "months"
+
+
+class ReaderManifest:
+    """
+    Static data for the /read/ web interface, kept apart from the episode
+    store so the page never downloads podcast transcripts:
+
+    - read/data/<date>.json: one episode's reading payload
+    - read/data/months/<YYYY-MM>.json: that month's entries (date, topics, path)
+    - read/data/manifest.json: list of months, newest first
+
+    The page's first load is the manifest, one month and one payload, so it
+    stays the same size however long the archive gets.
+    """
+
+    def __init__(self, directory: str = READER_DATA_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def _load(self, path: str, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return default
+
+    def _write_json(self, path: str, data):
+        with atomic_writer(path, binary=False) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    def _month_path(self, month: str) -> str:
+        return os.path.join(self.directory, MONTHS_DIR, f"{month}.json")
+
+    def publish(self, episode: Dict):
+        """Write (or replace) one episode's payload and its manifest entries."""
+        date = episode["date"]
+        month = date[:7]
+        payload_name = f"{date}.json"
+        self._write_json(os.path.join(self.directory, payload_name), {
+            "date": date,
+            "reading_topic": episode.get("reading_topic"),
+            "reading_content": episode.get("reading_content", ""),
+        })
+
+        entry = {
+            "date": date,
+            "listening_topic": episode.get("listening_topic"),
+            "reading_topic": episode.get("reading_topic"),
+            "path": payload_name,
+        }
+        month_path = self._month_path(month)
+        entries: List[Dict] = [e for e in self._load(month_path, []) if e.get("date") != date]
+        entries.append(entry)
+        entries.sort(key=lambda e: e["date"], reverse=True)
+        self._write_json(month_path, entries)
+
+        manifest = self._load(self.manifest_path, {"months": []})
+        if month not in manifest["months"]:
+            manifest["months"] = sorted(manifest["months"] + [month], reverse=True)
+            self._write_json(self.manifest_path, manifest)
@@ -0,0 +1,150 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from typing import BinaryIO, Dict, Optional
+
+from utils.storage import atomic_writer
+
+CACHE_DIR = os.environ.get("GEMINI_CACHE_DIR", "")
+DEFAULT_TTL_SECONDS = int(float(os.environ.get("GEMINI_CACHE_TTL_HOURS", "24")) * 3600)
+# Total size of cached responses; least recently used entries are evicted past it
+DEFAULT_MAX_BYTES = int(float(os.environ.get("GEMINI_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for Gemini responses.
+    Entries are keyed by a hash of the model and the full request payload
+    (prompt, generationConfig, tools), stored as <key>.bin with a <key>.json
+    sidecar holding the expiry time. The .bin file's mtime is its last use:
+    hits touch it, and every write deletes expired entries, then the least
+    recently used ones until the cache fits in max_bytes.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Build the cache configured by GEMINI_CACHE_DIR, or None if caching is off."""
+        if not CACHE_DIR:
+            return None
+        return cls(CACHE_DIR)
+
+    def key(self, model: str, payload: Dict) -> str:
+        canonical = json.dumps({"model": model, "payload": payload}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> tuple:
+        return (
+            os.path.join(self.directory, f"{key}.bin"),
+            os.path.join(self.directory, f"{key}.json"),
+        )
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Open a live entry for reading, or return None (counted as a miss)."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("expires_at", 0) < time.time():
+                self._count(hit=False)
+                return None
+            entry = open(data_path, "rb")
+            # Mark as recently used for eviction
+            os.utime(data_path)
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.open(key)
+        if entry is None:
+            return None
+        with entry:
+            return entry.read()
+
+    def put_stream(self, key: str, stream: BinaryIO, ttl_seconds: Optional[int] = None):
+        """Store everything from the stream's current position to its end."""
+        data_path, meta_path = self._paths(key)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        # Written atomically, so readers never see a partial entry
+        with atomic_writer(data_path) as f:
+            shutil.copyfileobj(stream, f)
+        with atomic_writer(meta_path, binary=False) as f:
+            json.dump({"expires_at": time.time() + ttl}, f)
+        self.evict(keep=key)
+
+    def _remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Delete expired entries, then the least recently used ones until the
+        cache fits in max_bytes (keep, the entry just written, is spared).
+        Returns how many entries were deleted.
+        """
+        now = time.time()
+        removed = 0
+        entries = []
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-len(".json")]
+                data_path, meta_path = self._paths(key)
+                try:
+                    with open(meta_path, "r") as f:
+                        expires_at = json.load(f).get("expires_at", 0)
+                    stat = os.stat(data_path)
+                except (OSError, ValueError):
+                    expires_at, stat = 0, None
+                if expires_at < now or stat is None:
+                    if key != keep:
+                        self._remove(key)
+                        removed += 1
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, key))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self._remove(key)
+                total -= size
+                removed += 1
+        return removed
+
+    def put(self, key: str, data: bytes, ttl_seconds: Optional[int] = None):
+        self.put_stream(key, io.BytesIO(data), ttl_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
@@ -0,0 +1,111 @@
+import heapq
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# SM-2 defaults
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# There is no learner feedback yet, so a delivered review counts as a correct
+# recall after some hesitation (SM-2 grades run 0-5; below 3 restarts the schedule)
+DEFAULT_REVIEW_QUALITY = 4
+
+# (category, topic_name, subtopic_id)
+ReviewKey = Tuple[str, str, str]
+
+
+def _add_days(day: str, days: int) -> str:
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def schedule_after_study(entry: Dict, today: str):
+    """A (re)studied subtopic restarts its schedule: first review the next day, ease kept."""
+    entry.setdefault("ease", DEFAULT_EASE)
+    entry["repetitions"] = 0
+    entry["interval"] = 1
+    entry["due"] = _add_days(today, 1)
+
+
+def schedule_after_review(entry: Dict, quality: int, today: str):
+    """Update interval, ease and due date per SM-2 for a review graded quality (0-5)."""
+    ease = entry.get("ease", DEFAULT_EASE)
+    if quality < 3:
+        entry["repetitions"] = 0
+        entry["interval"] = 1
+    else:
+        repetitions = entry.get("repetitions", 0) + 1
+        entry["repetitions"] = repetitions
+        if repetitions == 1:
+            entry["interval"] = 1
+        elif repetitions == 2:
+            entry["interval"] = 6
+        else:
+            entry["interval"] = max(1, round(entry.get("interval", 1) * ease))
+    entry["ease"] = round(max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)), 2)
+    entry["due"] = _add_days(today, entry["interval"])
+
+
+def backfill_schedule(entry: Dict) -> bool:
+    """
+    Give a studied entry from before reviews were scheduled its first review,
+    the day after it was last studied. Returns True if the entry changed.
+    """
+    if "due" in entry or entry.get("completed_episodes", 0) <= 0:
+        return False
+    schedule_after_study(entry, entry.get("last_studied") or "1970-01-01")
+    return True
+
+
+class ReviewScheduler:
+    """
+    Priority queue of scheduled reviews over a progress tree, ordered by due
+    date. Entries whose due date changed since they were queued are dropped
+    lazily, so updates are O(log n) pushes and the next k reviews cost
+    O(k log n) rather than a sort of all progress.
+    """
+
+    def __init__(self, progress: Dict):
+        self.progress = progress
+        self._heap: List[Tuple[str, str, str, str]] = [
+            (entry["due"], category, topic_name, subtopic_id)
+            for category, topics in progress.items()
+            for topic_name, subtopics in topics.items()
+            for subtopic_id, entry in subtopics.items()
+            if "due" in entry
+        ]
+        heapq.heapify(self._heap)
+
+    def schedule(self, category: str, topic_name: str, subtopic_id: str):
+        """Queue the entry at its current due date (call after changing it)."""
+        entry = self.progress[category][topic_name][subtopic_id]
+        heapq.heappush(self._heap, (entry["due"], category, topic_name, subtopic_id))
+
+    def _is_current(self, item: Tuple[str, str, str, str]) -> bool:
+        due, category, topic_name, subtopic_id = item
+        entry = self.progress.get(category, {}).get(topic_name, {}).get(subtopic_id)
+        return entry is not None and entry.get("due") == due
+
+    def next_reviews(self, count: int, today: Optional[str] = None,
+                     exclude: Iterable[ReviewKey] = ()) -> List[ReviewKey]:
+        """
+        Up to count reviews, earliest due first; with today, only those due
+        on or before it. Excluded keys are skipped but stay queued.
+        """
+        exclude = set(exclude)
+        kept: List[Tuple[str, str, str, str]] = []
+        seen = set()
+        reviews: List[ReviewKey] = []
+        while self._heap and len(reviews) < count:
+            item = heapq.heappop(self._heap)
+            key = item[1:]
+            if key in seen or not self._is_current(item):
+                # Stale or duplicate entry: drop it for good
+                continue
+            seen.add(key)
+            kept.append(item)
+            if today is not None and item[0] > today:
+                break
+            if key not in exclude:
+                reviews.append(key)
+        for item in kept:
+            heapq.heappush(self._heap, item)
+        return reviews
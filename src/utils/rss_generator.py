@@ -1,63 +1,278 @@
+import hashlib
+import json
 import os
+import re
 from datetime import datetime
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
 
-from feedgen.feed import FeedGenerator
+from feedgen.ext.base import BaseEntryExtension, BaseExtension
+
+from utils.storage import atomic_writer
+
+if TYPE_CHECKING:
+    from feedgen.feed import FeedGenerator
 
 FEED_FILE = "feed.xml"
+# Content hash of each episode as last rendered, keyed by date, plus a digest per archive page
+FEED_CACHE_FILE = "feed_cache.json"
+# Bump whenever item rendering changes, so cached items are re-rendered
+FEED_CACHE_VERSION = 2
+# Latest items kept in the main feed that clients poll
+FEED_MAX_ITEMS = int(os.environ.get("FEED_MAX_ITEMS", "20"))
+# Transcript characters kept in each item's description; the full text is linked
+FEED_DESCRIPTION_MAX_CHARS = int(os.environ.get("FEED_DESCRIPTION_MAX_CHARS", "1500"))
+# Older items go into RFC 5005 archive documents of FEED_ARCHIVE_PAGE_SIZE items,
+# oldest first. Not configurable: changing it would move items between pages
+FEED_ARCHIVE_DIR = "feed-archive"
+FEED_ARCHIVE_PAGE_SIZE = 20
+TRANSCRIPTS_DIR = "transcripts"
 # We keep the BASE_URL for the feed link itself, but audio links will come from Drive
 BASE_URL = "https://longieee.github.io/daily-french-learning"
 # Placeholder image - you should replace this with a real 1400x1400+ image
 PODCAST_IMAGE = "https://longieee.github.io/daily-french-learning/artwork.jpg"
 
-class RSSGenerator:
+ITEM_PATTERN = re.compile(r"<item>.*?</item>", re.DOTALL)
+GUID_PATTERN = re.compile(r"<guid[^>]*>daily-drill-([0-9-]+)</guid>")
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+HISTORY_NS = "http://purl.org/syndication/history/1.0"
+
+
+class FeedHistoryExtension(BaseExtension):
+    """feedgen extension adding RFC 5005 paging links (and fh:archive) to an RSS channel."""
+
     def __init__(self):
-        self.fg = FeedGenerator()
-        self.fg.load_extension('podcast')
-        self.fg.title("L'Obsédé - Daily French Drill")
-        self.fg.description("Automated French learning: Literature, Philosophy, Math, and Physics.")
-        self.fg.link(href=BASE_URL, rel='alternate')
-        self.fg.language('fr')
-        self.fg.author({'name': 'The Machine', 'email': 'bot@machine.com'})
+        self.links: List[Dict[str, str]] = []
+        self.is_archive = False
+
+    def extend_ns(self):
+        return {'fh': HISTORY_NS}
+
+    def link(self, href: str, rel: str):
+        self.links.append({'href': href, 'rel': rel})
+
+    def archive(self):
+        """Mark the document as an immutable archive."""
+        self.is_archive = True
+
+    def extend_rss(self, feed):
+        channel = feed[0]
+        for link in self.links:
+            el = channel.makeelement(f"{{{ATOM_NS}}}link", link)
+            channel.append(el)
+        if self.is_archive:
+            channel.append(channel.makeelement(f"{{{HISTORY_NS}}}archive", {}))
+        return feed
+
+
+class RSSGenerator:
+    """
+    Writes the podcast feed, its cache, archive pages and transcripts under
+    root, for serving at base_url (the site root by default).
+    """
+
+    def __init__(self, root: str = "", base_url: str = BASE_URL):
+        self.base_url = base_url
+        self.feed_path = os.path.join(root, FEED_FILE)
+        self.cache_path = os.path.join(root, FEED_CACHE_FILE)
+        self.archive_dir = os.path.join(root, FEED_ARCHIVE_DIR)
+        self.transcripts_dir = os.path.join(root, TRANSCRIPTS_DIR)
+
+    def _new_feed(self) -> "FeedGenerator":
+        """Create a feed with the channel metadata and no items."""
+        # feedgen (and lxml) are only loaded once a feed is actually written
+        from feedgen.feed import FeedGenerator
+
+        fg = FeedGenerator()
+        fg.load_extension('podcast')
+        fg.register_extension('history', FeedHistoryExtension, BaseEntryExtension, atom=False)
+        fg.title("L'Obsédé - Daily French Drill")
+        fg.description("Automated French learning: Literature, Philosophy, Math, and Physics.")
+        fg.link(href=self.base_url, rel='alternate')
+        fg.language('fr')
+        fg.author({'name': 'The Machine', 'email': 'bot@machine.com'})
         
         # Required for Apple Podcasts
-        self.fg.logo(PODCAST_IMAGE)
-        self.fg.image(PODCAST_IMAGE)
+        fg.logo(PODCAST_IMAGE)
+        fg.image(PODCAST_IMAGE)
 
         # Podcast specific settings (iTunes)
-        self.fg.podcast.itunes_category('Education', 'Language Courses')
-        self.fg.podcast.itunes_explicit('no')
-        self.fg.podcast.itunes_author('The Machine')
-        self.fg.podcast.itunes_summary("Daily automated French learning podcast covering Literature, Philosophy, Mathematics, and Physics. Each episode features listening comprehension and vocabulary building.")
-        self.fg.podcast.itunes_image(PODCAST_IMAGE)
-        self.fg.podcast.itunes_owner(name='The Machine', email='bot@machine.com')
-
-    def generate_feed(self, episodes: List[Dict]):
-        # episodes is a list of dicts from EpisodeManager
-
-        for ep in episodes:
-            date_str = ep.get("date")
+        fg.podcast.itunes_category('Education', 'Language Courses')
+        fg.podcast.itunes_explicit('no')
+        fg.podcast.itunes_author('The Machine')
+        fg.podcast.itunes_summary("Daily automated French learning podcast covering Literature, Philosophy, Mathematics, and Physics. Each episode features listening comprehension and vocabulary building.")
+        fg.podcast.itunes_image(PODCAST_IMAGE)
+        fg.podcast.itunes_owner(name='The Machine', email='bot@machine.com')
+        return fg
+
+    def _transcript_url(self, date_str: str) -> str:
+        return f"{self.base_url}/{TRANSCRIPTS_DIR}/{date_str}.txt"
+
+    def _archive_path(self, page: int) -> str:
+        return os.path.join(self.archive_dir, f"{page:04d}.xml")
+
+    def _archive_url(self, page: int) -> str:
+        return f"{self.base_url}/{FEED_ARCHIVE_DIR}/{page:04d}.xml"
+
+    def _description(self, ep: Dict) -> str:
+        """Transcript trimmed to FEED_DESCRIPTION_MAX_CHARS, followed by a link to the full text."""
+        text = ep.get("description", "Daily French Drill.")
+        if len(text) > FEED_DESCRIPTION_MAX_CHARS:
+            text = text[:FEED_DESCRIPTION_MAX_CHARS].rsplit(" ", 1)[0].rstrip() + " …"
+        return f"{text}\n\nFull transcript: {self._transcript_url(ep.get('date'))}"
+
+    def _publish_transcript(self, ep: Dict):
+        with atomic_writer(os.path.join(self.transcripts_dir, f"{ep['date']}.txt"), binary=False) as f:
+            f.write(ep.get("description", ""))
+
+    def _add_entry(self, fg: "FeedGenerator", ep: Dict) -> bool:
+        """Add one episode as a feed item. Returns False if its date is invalid."""
+        date_str = ep.get("date")
+        try:
+            dt = datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            return False
+
+        fe = fg.add_entry()
+        fe.id(f"daily-drill-{date_str}")
+        fe.title(f"Drill: {date_str} - {ep.get('listening_topic')}")
+        fe.link(href=ep.get("audio_url"))
+
+        fe.description(self._description(ep))
+        fe.pubDate(dt.replace(hour=6, minute=0, second=0, microsecond=0).astimezone())
+
+        # Enclosure - use file_size if available, otherwise estimate based on duration
+        # Most podcast apps require a non-zero length
+        file_size = ep.get("file_size", 0)
+        if file_size == 0:
+            # Estimate: ~128kbps MP3 = 16KB/sec, 10 min episode = ~10MB
+            file_size = 10000000  # 10MB default estimate
+        fe.enclosure(ep.get("audio_url"), str(file_size), 'audio/mpeg')
+        return True
+
+    def generate_feed(self, episode_manager) -> int:
+        """Re-render every item, the main feed and all archive pages from scratch."""
+        return self.update_feed(episode_manager, rebuild=True)
+
+    def _render_item(self, ep: Dict) -> str:
+        """Render a single episode's <item> fragment and publish its full transcript."""
+        from feedgen.feed import FeedGenerator
+
+        fg = FeedGenerator()
+        fg.load_extension('podcast')
+        fg.title("item")
+        fg.link(href=self.base_url)
+        fg.description("item")
+        if not self._add_entry(fg, ep):
+            return ""
+        self._publish_transcript(ep)
+        return ITEM_PATTERN.search(fg.rss_str().decode("utf-8")).group(0)
+
+    def _render_settings(self) -> Dict:
+        """Everything besides episode content that affects a rendered item."""
+        return {"version": FEED_CACHE_VERSION, "description_max_chars": FEED_DESCRIPTION_MAX_CHARS}
+
+    def _load_cache(self) -> Dict:
+        empty = {"render": self._render_settings(), "items": {}, "archives": {}}
+        if not os.path.exists(self.cache_path):
+            return empty
+        with open(self.cache_path, "r") as f:
             try:
-                dt = datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                continue
+                cache = json.load(f)
+            except json.JSONDecodeError:
+                return empty
+        if cache.get("render") != self._render_settings():
+            return empty
+        return cache
+
+    def _read_fragments(self, path: str, hashes: Dict[str, str]) -> Dict[str, Dict]:
+        """Return {date: {"hash", "xml"}} for the items of a previously written feed document."""
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            feed = f.read()
+        items = {}
+        for match in ITEM_PATTERN.finditer(feed):
+            guid = GUID_PATTERN.search(match.group(0))
+            if guid and guid.group(1) in hashes:
+                items[guid.group(1)] = {"hash": hashes[guid.group(1)], "xml": match.group(0)}
+        return items
+
+    def _write_document(self, path: str, items: List[str], links: Dict[str, str], archive: bool = False):
+        """Write the channel metadata, paging links and the given item fragments."""
+        fg = self._new_feed()
+        for rel, href in links.items():
+            fg.history.link(href, rel)
+        if archive:
+            fg.history.archive()
+        # Channel metadata (and lastBuildDate) is cheap to regenerate
+        head, tail = fg.rss_str().decode("utf-8").rsplit("</channel>", 1)
+        with atomic_writer(path, binary=False) as f:
+            f.write(head + "".join(items) + "</channel>" + tail)
+
+    def update_feed(self, episode_manager, rebuild: bool = False) -> int:
+        """
+        Incrementally rebuild FEED_FILE and its archive pages from the episode store.
 
-            fe = self.fg.add_entry()
-            fe.id(f"daily-drill-{date_str}")
-            fe.title(f"Drill: {date_str} - {ep.get('listening_topic')}")
-            fe.link(href=ep.get("audio_url"))
+        The main feed holds the latest FEED_MAX_ITEMS items (and at least every
+        item not yet in a complete archive page) and links to the newest archive
+        page with rel="prev-archive". Each complete page of FEED_ARCHIVE_PAGE_SIZE
+        older items is an RFC 5005 archive document, linked to its predecessor,
+        and is only rewritten when one of its items changes.
 
-            fe.description(ep.get("description", "Daily French Drill."))
-            fe.pubDate(dt.replace(hour=6, minute=0, second=0, microsecond=0).astimezone())
+        Items whose content hash matches the last render are spliced in from the
+        existing documents as-is; only new or changed episodes are loaded and
+        rendered. Returns the number of items rendered.
+        """
+        cache = {"items": {}, "archives": {}} if rebuild else self._load_cache()
+        index = episode_manager.get_index()
+        # Oldest first, so archive page boundaries never move
+        dates = sorted(index)
+        hashes = {date: index[date].get("content_hash") for date in dates}
+        pages = len(dates) // FEED_ARCHIVE_PAGE_SIZE
+        window = max(FEED_MAX_ITEMS, len(dates) - pages * FEED_ARCHIVE_PAGE_SIZE)
+        window_dates = dates[-window:] if window else []
+
+        fragments = {} if rebuild else self._read_fragments(self.feed_path, cache["items"])
+        rendered = 0
+
+        def item_xml(date: str) -> str:
+            nonlocal rendered
+            cached = fragments.get(date)
+            if hashes[date] and cached and cached["hash"] == hashes[date]:
+                return cached["xml"]
+            fragments[date] = {"hash": hashes[date], "xml": self._render_item(episode_manager.get_episode(date))}
+            rendered += 1
+            return fragments[date]["xml"]
+
+        archives = {}
+        for page in range(1, pages + 1):
+            page_dates = dates[(page - 1) * FEED_ARCHIVE_PAGE_SIZE:page * FEED_ARCHIVE_PAGE_SIZE]
+            digest = hashlib.sha256("".join(f"{d}:{hashes[d]}" for d in page_dates).encode("utf-8")).hexdigest()
+            archives[str(page)] = digest
+            path = self._archive_path(page)
+            if cache["archives"].get(str(page)) == digest and os.path.exists(path):
+                continue
+            if not rebuild:
+                fragments.update(self._read_fragments(path, cache["items"]))
+            links = {"self": self._archive_url(page), "current": f"{self.base_url}/{FEED_FILE}"}
+            if page > 1:
+                links["prev-archive"] = self._archive_url(page - 1)
+            self._write_document(path, [item_xml(d) for d in page_dates], links, archive=True)
 
-            # Enclosure - use file_size if available, otherwise estimate based on duration
-            # Most podcast apps require a non-zero length
-            file_size = ep.get("file_size", 0)
-            if file_size == 0:
-                # Estimate: ~128kbps MP3 = 16KB/sec, 10 min episode = ~10MB
-                file_size = 10000000  # 10MB default estimate
-            fe.enclosure(ep.get("audio_url"), str(file_size), 'audio/mpeg')
+        links = {"self": f"{self.base_url}/{FEED_FILE}"}
+        if pages:
+            links["prev-archive"] = self._archive_url(pages)
+        self._write_document(self.feed_path, [item_xml(d) for d in window_dates], links)
 
-        # Generate feed file
-        self.fg.rss_file(FEED_FILE)
+        # Written last and atomically: a cache that exists always matches the files above
+        with atomic_writer(self.cache_path, binary=False) as f:
+            json.dump({
+                "render": self._render_settings(),
+                "items": {d: h for d, h in hashes.items() if h},
+                "archives": archives,
+            }, f, indent=2, sort_keys=True)
 
+        print(f"Feed updated: {rendered} item(s) rendered, {len(window_dates)} in {self.feed_path}, "
+              f"{pages} archive page(s)")
+        return rendered
@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+from typing import IO, Any, ContextManager, Optional
+
+from utils.storage import atomic_writer
+
+RUNS_DIR = "content/runs"
+
+
+class RunCheckpoint:
+    """
+    Per-date directory of stage artifacts (topic plan, script, PCM chunks,
+    MP3, Drive upload record, reading content) so a failed daily run can be
+    resumed from the last completed stage.
+    Artifacts are written atomically, so a file that exists is complete.
+    """
+
+    def __init__(self, date_str: str, resume: bool = False, root: str = RUNS_DIR):
+        self.directory = os.path.join(root, date_str)
+        self.resume = resume
+        if not resume:
+            # A fresh run must not pick up artifacts from an earlier attempt
+            self.clear()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def clear(self):
+        """Drop every artifact, so all stages run again."""
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def has(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def load_json(self, name: str) -> Optional[Any]:
+        """Return a saved JSON artifact, or None if it is missing or unreadable."""
+        try:
+            with open(self.path(name), "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save_json(self, name: str, data: Any):
+        with self.atomic_writer(name, binary=False) as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def atomic_writer(self, name: str, binary: bool = True) -> ContextManager[IO]:
+        """Yield a temp file that replaces the artifact only if the block succeeds."""
+        return atomic_writer(self.path(name), binary)
+
+    def is_complete(self) -> bool:
+        return self.has("completed.json")
+
+    def mark_complete(self):
+        """Record that the run finished and drop the bulky audio artifacts."""
+        self.save_json("completed.json", {"completed": True})
+        self.drop_audio()
+
+    def drop_audio(self):
+        """Remove PCM chunks and the MP3 once the upload is recorded."""
+        for name in os.listdir(self.directory):
+            if name.endswith((".pcm", ".mp3")):
+                os.remove(self.path(name))
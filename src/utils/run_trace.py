@@ -0,0 +1,163 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.storage import atomic_writer
+
+RUN_HISTORY_FILE = "run_history.jsonl"
+
+# Span the code running in this context reports to (None outside a traced run)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed stage of a run. Counters: bytes_out (sent to a service or
+    process), bytes_in (received from it), retries, and any others passed to add().
+    """
+
+    def __init__(self, name: str, origin: float, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.origin = origin
+        self.attrs = dict(attrs or {})
+        self.counters = {"bytes_in": 0, "bytes_out": 0, "retries": 0}
+        self.children: List["Span"] = []
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def child(self, name: str, attrs: Optional[Dict[str, Any]] = None) -> "Span":
+        span = Span(name, self.origin, attrs)
+        with _lock:
+            self.children.append(span)
+        return span
+
+    def add(self, **counters: int):
+        with _lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, **attrs: Any):
+        self.attrs.update(attrs)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.ended is None:
+            self.ended = time.perf_counter()
+        if error is not None and self.error is None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.ended if self.ended is not None else time.perf_counter()
+        data = {
+            "name": self.name,
+            "start": round(self.started - self.origin, 3),
+            "seconds": round(end - self.started, 3),
+        }
+        data.update(self.attrs)
+        # Zero counters are left out to keep the history compact
+        data.update({key: value for key, value in self.counters.items() if value})
+        if self.error:
+            data["error"] = self.error
+        with _lock:
+            children = sorted(self.children, key=lambda span: span.started)
+        if children:
+            data["children"] = [span.to_dict() for span in children]
+        return data
+
+
+class RunTrace:
+    """
+    Nested timing spans for one daily run, written as a JSON run report.
+    Spans are attached to the current span of the calling context, so threads
+    must be started through propagate() to report under their parent.
+    """
+
+    def __init__(self, date_str: str, resume: bool = False, prefetch: bool = False):
+        self.date_str = date_str
+        self.resume = resume
+        self.prefetch = prefetch
+        self.started_at = datetime.utcnow()
+        self.root = Span("run", time.perf_counter())
+
+    @contextmanager
+    def activate(self) -> Iterator[Span]:
+        """Make the root span current, so spans opened in this block nest under it."""
+        token = _current_span.set(self.root)
+        try:
+            yield self.root
+        finally:
+            _current_span.reset(token)
+
+    def report(self) -> Dict[str, Any]:
+        spans = self.root.to_dict()
+        return {
+            "date": self.date_str,
+            "started_at": self.started_at.isoformat(timespec="seconds") + "Z",
+            "resume": self.resume,
+            "prefetch": self.prefetch,
+            "status": "failed" if self.root.error else "completed",
+            "seconds": spans.pop("seconds"),
+            "error": spans.pop("error", None),
+            "spans": spans.get("children", []),
+        }
+
+    def save(self, history_path: str = RUN_HISTORY_FILE, report_path: Optional[str] = None) -> Dict[str, Any]:
+        """Append the report to the history file (one JSON object per line) and optionally write it alone."""
+        report = self.report()
+        line = json.dumps(report, ensure_ascii=False, separators=(",", ":"))
+        with open(history_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        if report_path:
+            with atomic_writer(report_path, binary=False) as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
+
+    def summary(self) -> str:
+        """Top-level stages and their wall time, for the run log."""
+        report = self.report()
+        parts = [f"{span['name']} {span['seconds']:.1f}s" for span in report["spans"]]
+        return f"Run took {report['seconds']:.1f}s: " + ", ".join(parts)
+
+
+def current_span() -> Span:
+    """The current span, or a detached one (discarded) outside a traced run."""
+    span = _current_span.get()
+    return span if span is not None else Span("untraced", time.perf_counter())
+
+
+def start_span(name: str, **attrs: Any) -> Span:
+    """
+    Open a child of the current span without making it current. For stages
+    that outlive the calling block (generators, subprocesses); call finish().
+    """
+    return current_span().child(name, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time the block as a child of the current span, and make it current."""
+    child = start_span(name, **attrs)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def propagate(func: Callable) -> Callable:
+    """Bind func to the caller's current span, for running it on another thread."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return run
@@ -1,16 +1,39 @@
+import hashlib
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
+
+from utils.curriculum_index import CurriculumIndex
+from utils.curriculum_manager import FALLBACK_SUBTOPIC_ID, FALLBACK_TOPIC
+from utils.review_scheduler import (
+    DEFAULT_REVIEW_QUALITY,
+    ReviewKey,
+    ReviewScheduler,
+    backfill_schedule,
+    schedule_after_review,
+    schedule_after_study,
+)
+from utils.storage import SqliteStore, write_json_atomic
 
 STATE_FILE = "user_state.json"
 LEVEL_THRESHOLDS = {"A2": 60, "B1": 120, "B2": 200}
 
 
 class StateManager:
-    def __init__(self, filepath: str = STATE_FILE):
+    def __init__(self, filepath: str = STATE_FILE, curriculum_index: Optional[CurriculumIndex] = None,
+                 store: Optional[SqliteStore] = None):
         self.filepath = filepath
+        # With a store, state lives in its database instead of filepath
+        self.store = store
+        # Progress entries changed since the last save; the store only rewrites those
+        self._changed_progress = set()
         self.state = self._load_state()
+        self._backfill_review_schedule()
+        # Spaced-repetition queue over progress (due date, ease and interval per subtopic)
+        self.reviews = ReviewScheduler(self.state["progress"])
+        # Kept in step with progress by update_progress
+        self.curriculum_index = curriculum_index
 
     def _load_state(self) -> dict:
         default_progress = {
@@ -19,7 +42,14 @@ class StateManager:
             "physics": {},
             "mathematics": {},
         }
-        if not os.path.exists(self.filepath):
+        if self.store:
+            data = self.store.load_state()
+        elif os.path.exists(self.filepath):
+            with open(self.filepath, "r") as f:
+                data = json.load(f)
+        else:
+            data = None
+        if data is None:
             return {
                 "current_level": "A2",
                 "xp_in_level": 0,
@@ -29,30 +59,54 @@ class StateManager:
                 "current_chain": None,
                 "progress": default_progress,
             }
-        with open(self.filepath, "r") as f:
-            data = json.load(f)
-            # Migration logic
-            if "xp_in_level" not in data:
-                data["xp_in_level"] = 0
-            if "status" not in data:
-                data["status"] = "TRAINING"
-            if "progress" not in data:
-                data["progress"] = default_progress
-            else:
-                # Ensure all categories exist
-                for cat in default_progress:
-                    if cat not in data["progress"]:
-                        data["progress"][cat] = {}
-            if "current_chain" not in data:
-                data["current_chain"] = None
-            # Remove old topics_covered if exists
-            if "topics_covered" in data:
-                del data["topics_covered"]
-            return data
+        # Migration logic
+        if "xp_in_level" not in data:
+            data["xp_in_level"] = 0
+        if "status" not in data:
+            data["status"] = "TRAINING"
+        if "progress" not in data:
+            data["progress"] = default_progress
+        else:
+            # Ensure all categories exist
+            for cat in default_progress:
+                if cat not in data["progress"]:
+                    data["progress"][cat] = {}
+        if "current_chain" not in data:
+            data["current_chain"] = None
+        # Fallback lessons recorded as progress before they were kept out of it
+        for topics in data["progress"].values():
+            fallback = topics.get(FALLBACK_TOPIC, {})
+            fallback.pop(FALLBACK_SUBTOPIC_ID, None)
+            if FALLBACK_TOPIC in topics and not fallback:
+                del topics[FALLBACK_TOPIC]
+        # Remove old topics_covered if exists
+        if "topics_covered" in data:
+            del data["topics_covered"]
+        return data
+
+    def _backfill_review_schedule(self):
+        """Schedule a first review for subtopics studied before reviews were tracked."""
+        for category, topics in self.state["progress"].items():
+            for topic_name, subtopics in topics.items():
+                for subtopic_id, entry in subtopics.items():
+                    if backfill_schedule(entry):
+                        self._changed_progress.add((category, topic_name, subtopic_id))
+
+    def fingerprint(self) -> str:
+        """Hash of the whole state, to tell whether work planned against it is still valid."""
+        canonical = json.dumps(self.state, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
     def save_state(self):
-        with open(self.filepath, "w") as f:
-            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        if self.store:
+            progress = self.state["progress"]
+            self.store.save_state(self.state, [
+                (category, topic_name, subtopic_id, progress[category][topic_name][subtopic_id])
+                for category, topic_name, subtopic_id in sorted(self._changed_progress)
+            ])
+            self._changed_progress.clear()
+        else:
+            write_json_atomic(self.filepath, self.state)
 
     def get_current_level(self) -> str:
         return self.state.get("current_level", "A2")
@@ -93,7 +147,9 @@ class StateManager:
     def update_progress(
         self, category: str, topic_name: str, subtopic_id: str, episode_completed: int
     ):
-        """Update progress for a specific subtopic."""
+        """Update progress for a specific subtopic (the fallback lesson is not tracked)."""
+        if (topic_name, subtopic_id) == (FALLBACK_TOPIC, FALLBACK_SUBTOPIC_ID):
+            return
         if category not in self.state["progress"]:
             self.state["progress"][category] = {}
         if topic_name not in self.state["progress"][category]:
@@ -110,6 +166,44 @@ class StateManager:
         self.state["progress"][category][topic_name][subtopic_id]["last_studied"] = (
             datetime.utcnow().strftime("%Y-%m-%d")
         )
+        schedule_after_study(
+            self.state["progress"][category][topic_name][subtopic_id],
+            datetime.utcnow().strftime("%Y-%m-%d"),
+        )
+        self.reviews.schedule(category, topic_name, subtopic_id)
+        self._changed_progress.add((category, topic_name, subtopic_id))
+        if self.curriculum_index:
+            self.curriculum_index.record(
+                self.state["progress"], category, topic_name, subtopic_id, episode_completed
+            )
+
+    def get_due_reviews(
+        self,
+        count: int,
+        due_only: bool = True,
+        exclude: Iterable[ReviewKey] = (),
+        as_of: Optional[str] = None,
+    ) -> List[ReviewKey]:
+        """
+        Next (category, topic_name, subtopic_id) reviews, most overdue first,
+        counting as due those due by as_of (default today).
+        With due_only=False, reviews not yet due fill the remaining slots.
+        """
+        today = (as_of or datetime.utcnow().strftime("%Y-%m-%d")) if due_only else None
+        return self.reviews.next_reviews(count, today=today, exclude=exclude)
+
+    def record_review(
+        self,
+        category: str,
+        topic_name: str,
+        subtopic_id: str,
+        quality: int = DEFAULT_REVIEW_QUALITY,
+    ):
+        """Reschedule a subtopic after it was reviewed (SM-2 quality 0-5)."""
+        entry = self.state["progress"][category][topic_name][subtopic_id]
+        schedule_after_review(entry, quality, datetime.utcnow().strftime("%Y-%m-%d"))
+        self.reviews.schedule(category, topic_name, subtopic_id)
+        self._changed_progress.add((category, topic_name, subtopic_id))
 
     def update_streak_and_date(self):
         last_date_str = self.state.get("last_run_date")
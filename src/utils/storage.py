@@ -0,0 +1,188 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import IO, Dict, Iterable, Iterator, Optional, Tuple
+
+# SQLite database holding state, progress, curriculum and episodes; unset keeps the JSON files
+STATE_DB = os.environ.get("STATE_DB", "")
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS progress (
+    category TEXT NOT NULL,
+    topic_name TEXT NOT NULL,
+    subtopic_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (category, topic_name, subtopic_id)
+);
+CREATE TABLE IF NOT EXISTS curriculum (
+    category TEXT NOT NULL,
+    topic_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (category, topic_name)
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    date TEXT PRIMARY KEY,
+    -- The index entry comes before the body, so listing the index never reads bodies
+    entry TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+"""
+
+# (category, topic_name, subtopic_id, progress entry)
+ProgressRow = Tuple[str, str, str, Dict]
+
+
+@contextmanager
+def atomic_writer(path: str, binary: bool = True) -> Iterator[IO]:
+    """
+    Yield a temp file in path's directory that replaces path only if the block
+    succeeds, so a crash never leaves a half-written file. The temp file is
+    readable by the owner only (mkstemp) and hidden, named .<name>.*.tmp.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w", encoding=None if binary else "utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write(path: str, raw: bytes):
+    with atomic_writer(path) as f:
+        f.write(raw)
+
+
+def write_json_atomic(path: str, data):
+    atomic_write(path, json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8"))
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteStore:
+    """
+    SQLite (WAL) storage behind StateManager, CurriculumManager and
+    EpisodeManager, with one row per progress entry, curriculum topic and
+    episode, so point reads and writes do not grow with history.
+    Writes outside transaction() commit on their own; inside it they join
+    the open transaction, so a whole daily run commits or rolls back at once.
+    """
+
+    def __init__(self, path: str = STATE_DB):
+        # Deferred: runs on the JSON files never load sqlite3
+        import sqlite3
+
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Transactions are managed explicitly (BEGIN/COMMIT), not by the sqlite3 module
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only risks the last commits on power loss, never corruption
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._depth = 0
+        # CREATE ... IF NOT EXISTS throughout, so this is safe on every open
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Commit the block's writes together (nested blocks join the outer one)."""
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.connection.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    # State and progress
+
+    def has_state(self) -> bool:
+        """Whether a state was ever saved here (a new or never-migrated database has none)."""
+        return self.connection.execute("SELECT 1 FROM meta WHERE key = 'state'").fetchone() is not None
+
+    def load_state(self) -> Optional[Dict]:
+        """The saved user state with its progress tree, or None if nothing is saved."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+        if row is None:
+            return None
+        state = json.loads(row[0])
+        progress: Dict = {}
+        for category, topic_name, subtopic_id, data in self.connection.execute(
+                "SELECT category, topic_name, subtopic_id, data FROM progress"):
+            progress.setdefault(category, {}).setdefault(topic_name, {})[subtopic_id] = json.loads(data)
+        state["progress"] = progress
+        return state
+
+    def save_state(self, state: Dict, progress_rows: Iterable[ProgressRow]):
+        """Save the state's scalar fields and the given progress entries."""
+        scalars = {key: value for key, value in state.items() if key != "progress"}
+        with self.transaction():
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)",
+                                    (_dumps(scalars),))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO progress (category, topic_name, subtopic_id, data) VALUES (?, ?, ?, ?)",
+                [(category, topic_name, subtopic_id, _dumps(entry))
+                 for category, topic_name, subtopic_id, entry in progress_rows])
+
+    # Curriculum
+
+    def load_curriculum(self) -> Dict:
+        """{category: {topic_name: topic_data}}, topics in the order they were added."""
+        curriculum: Dict = {}
+        for category, topic_name, data in self.connection.execute(
+                "SELECT category, topic_name, data FROM curriculum ORDER BY position"):
+            curriculum.setdefault(category, {})[topic_name] = json.loads(data)
+        return curriculum
+
+    def save_topic(self, category: str, topic_name: str, topic_data: Dict):
+        """Insert a topic at the end, or replace it in place."""
+        with self.transaction():
+            self.connection.execute(
+                "INSERT INTO curriculum (category, topic_name, position, data) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM curriculum), ?) "
+                "ON CONFLICT (category, topic_name) DO UPDATE SET data = excluded.data",
+                (category, topic_name, _dumps(topic_data)))
+
+    # Episodes
+
+    def load_episode_index(self) -> Dict[str, Dict]:
+        return {date: json.loads(entry)
+                for date, entry in self.connection.execute("SELECT date, entry FROM episodes ORDER BY date")}
+
+    def load_episode(self, date: str) -> Optional[Dict]:
+        row = self.connection.execute("SELECT body FROM episodes WHERE date = ?", (date,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_episode(self, episode: Dict, entry: Dict):
+        with self.transaction():
+            self.connection.execute("INSERT OR REPLACE INTO episodes (date, entry, body) VALUES (?, ?, ?)",
+                                    (episode["date"], _dumps(entry), _dumps(episode)))
@@ -0,0 +1,57 @@
+from googleapiclient.http import MediaUpload
+
+from utils.drive_client import STREAM_CHUNK_SIZE
+
+
+class StreamMediaUpload(MediaUpload):
+    """
+    Resumable upload of a non-seekable stream of unknown length (e.g. a pipe).
+    Only the bytes the server has not yet acknowledged are kept in memory.
+    """
+
+    def __init__(self, stream, mimetype: str, chunksize: int = STREAM_CHUNK_SIZE):
+        self._stream = stream
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._next_begin = 0
+        self._eof = False
+
+    def _fill(self, end: int):
+        """Read from the stream until the buffer reaches absolute offset end or EOF."""
+        while not self._eof and self._buffer_start + len(self._buffer) < end:
+            data = self._stream.read(end - self._buffer_start - len(self._buffer))
+            if not data:
+                self._eof = True
+            else:
+                self._buffer.extend(data)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # Read one byte past the next chunk, so the final chunk can carry the
+        # total size even when the stream length is an exact multiple of it.
+        self._fill(self._next_begin + self._chunksize + 1)
+        return self._buffer_start + len(self._buffer) if self._eof else None
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        if begin < self._buffer_start:
+            raise ValueError("Cannot rewind a streamed upload past acknowledged bytes")
+        # Everything before begin has been acknowledged by the server
+        del self._buffer[:begin - self._buffer_start]
+        self._buffer_start = begin
+        self._fill(begin + length)
+        data = bytes(self._buffer[:length])
+        self._next_begin = begin + len(data)
+        return data
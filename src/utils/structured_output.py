@@ -0,0 +1,178 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+# Response schemas (the OpenAPI subset Gemini accepts as responseSchema)
+TURN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "role": {"type": "STRING", "enum": ["tutor_en", "actor_fr"]},
+        "text": {"type": "STRING"},
+    },
+    "required": ["role", "text"],
+}
+SCRIPT_SCHEMA = {"type": "ARRAY", "items": TURN_SCHEMA, "minItems": 1}
+
+READING_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "level": {"type": "STRING"},
+        "text": {"type": "STRING"},
+        "vocabulary": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "term": {"type": "STRING"},
+                    "gender": {"type": "STRING"},
+                    "definition": {"type": "STRING"},
+                    "grammar_note": {"type": "STRING"},
+                },
+                "required": ["term", "definition"],
+            },
+        },
+        "exercises": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "type": {"type": "STRING",
+                             "enum": ["fill_blank", "true_false", "multiple_choice", "translation"]},
+                    "question": {"type": "STRING"},
+                    "answer": {"anyOf": [{"type": "STRING"}, {"type": "BOOLEAN"}]},
+                    "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "hint": {"type": "STRING"},
+                    "explanation": {"type": "STRING"},
+                    "accept_variations": {"type": "ARRAY", "items": {"type": "STRING"}},
+                },
+                "required": ["type", "question", "answer"],
+            },
+        },
+    },
+    "required": ["title", "level", "text", "vocabulary", "exercises"],
+}
+
+TOPIC_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "topic_name": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "subtopics": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": {"type": "STRING"},
+                    "title": {"type": "STRING"},
+                    "episodes": {"type": "INTEGER"},
+                    "description": {"type": "STRING"},
+                    "advanced": {"type": "BOOLEAN"},
+                },
+                "required": ["id", "title", "episodes"],
+            },
+            "minItems": 1,
+        },
+    },
+    "required": ["topic_name", "subtopics"],
+}
+
+
+def brainstorm_batch_schema(categories: List[str]) -> Dict:
+    """An array of new topics, each tagged with one of categories."""
+    item = dict(TOPIC_SCHEMA)
+    item["properties"] = dict(TOPIC_SCHEMA["properties"], category={"type": "STRING", "enum": list(categories)})
+    item["required"] = ["category"] + TOPIC_SCHEMA["required"]
+    return {"type": "ARRAY", "items": item, "minItems": 1}
+
+
+_TYPES = {
+    "OBJECT": dict,
+    "ARRAY": list,
+    "STRING": str,
+    "BOOLEAN": bool,
+    "INTEGER": int,
+    "NUMBER": (int, float),
+}
+
+Path = Tuple[Any, ...]
+
+
+class SchemaError(ValueError):
+    """A response that still fails its schema after repair."""
+
+
+def strip_code_fence(text: str) -> str:
+    """Strip whitespace and a Markdown code fence around a JSON response."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def schema_errors(value: Any, schema: Dict, path: Path = ()) -> List[Tuple[Path, str]]:
+    """Return (path, problem) for every place value breaks schema (empty if valid)."""
+    if "anyOf" in schema:
+        if any(not schema_errors(value, option, path) for option in schema["anyOf"]):
+            return []
+        return [(path, "matches none of the allowed types")]
+
+    expected = _TYPES[schema["type"].upper()]
+    # bool is an int in Python, but not in JSON
+    if not isinstance(value, expected) or (isinstance(value, bool) and schema["type"].upper() != "BOOLEAN"):
+        return [(path, f"expected {schema['type'].lower()}, got {type(value).__name__}")]
+    if "enum" in schema and value not in schema["enum"]:
+        return [(path, f"{value!r} is not one of {schema['enum']}")]
+
+    errors = []
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append((path + (key,), "missing"))
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(schema_errors(value[key], property_schema, path + (key,)))
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append((path, f"needs at least {schema['minItems']} item(s)"))
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(schema_errors(item, schema["items"], path + (i,)))
+    return errors
+
+
+def repair_target(path: Path) -> Path:
+    """
+    The part of the document to re-ask for when path is broken: the enclosing
+    array element if there is one, else the top-level field.
+    """
+    for i, key in enumerate(path):
+        if isinstance(key, int):
+            return path[:i + 1]
+    return path[:1]
+
+
+def subschema(schema: Dict, path: Path) -> Dict:
+    for key in path:
+        schema = schema["items"] if isinstance(key, int) else schema["properties"][key]
+    return schema
+
+
+def set_path(document: Any, path: Path, value: Any):
+    for key in path[:-1]:
+        document = document[key]
+    document[path[-1]] = value
+
+
+def format_path(path: Path) -> str:
+    text = ""
+    for key in path:
+        text += f"[{key}]" if isinstance(key, int) else (f".{key}" if text else key)
+    return text or "(root)"
+
+
+def parse_json(text: str) -> Any:
+    return json.loads(strip_code_fence(text))
@@ -0,0 +1,80 @@
+import math
+import os
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+# Upper bound on estimated speech per TTS request, keeping each request well
+# inside the 180s HTTP timeout
+TTS_MAX_CHUNK_SECONDS = float(os.environ.get("TTS_MAX_CHUNK_SECONDS", "150"))
+
+# Approximate speaking rates (characters per second) at the pacing asked for
+# in the director's notes: brisk English tutor, native-speed French
+LANGUAGE_CHARS_PER_SECOND = {"en": 14.0, "fr": 15.0}
+DEFAULT_CHARS_PER_SECOND = 14.0
+# Pause the voices leave around each turn
+ROLE_PAUSE_SECONDS = {"tutor_en": 0.8, "actor_fr": 0.5}
+DEFAULT_PAUSE_SECONDS = 0.6
+# How full a chunk must stay when moving a cut back to the previous speaker change
+SPEAKER_SPLIT_MIN_FILL = 0.75
+
+
+def estimate_turn_seconds(turn: Dict[str, str]) -> float:
+    """Estimate how long a script turn takes to speak, from its text length, language and role."""
+    role = turn.get("role", "")
+    language = role.rsplit("_", 1)[-1]
+    rate = LANGUAGE_CHARS_PER_SECOND.get(language, DEFAULT_CHARS_PER_SECOND)
+    pause = ROLE_PAUSE_SECONDS.get(role, DEFAULT_PAUSE_SECONDS)
+    return len(turn.get("text", "")) / rate + pause
+
+
+def plan_chunks(script: Iterable[Dict[str, str]],
+                max_chunk_seconds: float = TTS_MAX_CHUNK_SECONDS) -> Iterator[List[Dict[str, str]]]:
+    """
+    Pack script turns into TTS chunks of similar estimated duration.
+    Chunks stay under max_chunk_seconds and never split a turn. Cuts are moved
+    back to the last speaker change when that keeps the chunk at least
+    SPEAKER_SPLIT_MIN_FILL of the target, else they fall between two turns of
+    the same speaker.
+    A complete script (a list) is spread evenly over the fewest chunks that fit
+    the cap; a streamed script is packed greedily up to the cap so each chunk
+    can be synthesized as soon as it is full.
+    """
+    target = max_chunk_seconds
+    if isinstance(script, Sequence) and script:
+        total = sum(estimate_turn_seconds(turn) for turn in script)
+        target = min(max_chunk_seconds, total / math.ceil(total / max_chunk_seconds))
+
+    chunk: List[Dict[str, str]] = []
+    durations: List[float] = []
+    emitted_seconds = 0.0
+    emitted_chunks = 0
+    for turn in script:
+        seconds = estimate_turn_seconds(turn)
+        current = sum(durations)
+        # Cut once the turn would mostly fall past the next target boundary
+        # (measured from the start of the script, so rounding does not pile
+        # up in the last chunk), and always before the cap
+        boundary = (emitted_chunks + 1) * target
+        if chunk and (emitted_seconds + current + seconds / 2 > boundary
+                      or current + seconds > max_chunk_seconds):
+            # Prefer cutting at a speaker change, as long as that keeps the
+            # chunk near the target; otherwise cut between this speaker's turns
+            roles = [t.get("role") for t in chunk] + [turn.get("role")]
+            split = len(chunk)
+            kept = current
+            for j in range(len(chunk), 0, -1):
+                if roles[j - 1] != roles[j]:
+                    split = j
+                    break
+                kept -= durations[j - 1]
+                if kept < SPEAKER_SPLIT_MIN_FILL * target:
+                    break
+            if roles[split - 1] == roles[split] or sum(durations[split:]) + seconds > max_chunk_seconds:
+                split = len(chunk)
+            yield chunk[:split]
+            emitted_seconds += sum(durations[:split])
+            emitted_chunks += 1
+            chunk, durations = chunk[split:], durations[split:]
+        chunk.append(turn)
+        durations.append(seconds)
+    if chunk:
+        yield chunk
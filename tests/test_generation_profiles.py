@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import generation_profiles  # noqa: E402
+from utils.generation_profiles import PROFILES, hedge_delay  # noqa: E402
+
+
+class HedgeDelayTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.dict(generation_profiles._hedge_delays, clear=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def delay_for(self, latencies):
+        with mock.patch.object(generation_profiles, "recent_latencies", return_value=latencies):
+            return hedge_delay(PROFILES["listening_script"])
+
+    def test_uses_the_slo_until_enough_samples(self):
+        self.assertEqual(self.delay_for([5.0, 6.0]), PROFILES["listening_script"].latency_slo)
+
+    def test_hedges_at_the_p95_even_above_the_slo(self):
+        latencies = [80.0 + i for i in range(20)]
+        self.assertEqual(self.delay_for(latencies), 99.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agents.listening_agent import ListeningAgent  # noqa: E402
+from utils.gemini_client import GeminiClient  # noqa: E402
+from utils.generation_profiles import DEFAULT_MODEL  # noqa: E402
+from utils.rate_limiter import RateLimiter  # noqa: E402
+
+
+def sse_response(text: str) -> requests.Response:
+    """A streamed 200 response carrying text as a single SSE event, in raw UTF-8."""
+    event = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "text/event-stream"
+    response.raw = io.BytesIO(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+    response.request = requests.Request("POST", "http://gemini.test").prepare()
+    return response
+
+
+class StreamScriptRepairTest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(rpm=100_000, tpm=100_000_000, max_in_flight=1)
+        patches = [
+            mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test"}),
+            mock.patch.object(RateLimiter, "for_model", return_value=self.limiter),
+            # No backup requests: the test is about the one open stream
+            mock.patch("utils.gemini_client.hedge_delay", return_value=None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_broken_turn_is_repaired_after_the_stream_closes_with_one_slot(self):
+        script = json.dumps([
+            {"role": "tutor_en", "text": "Bonjour, voici l'été."},
+            {"role": "actor_fr"},
+            {"role": "tutor_en", "text": "À demain."},
+        ], ensure_ascii=False)
+        repaired = json.dumps({"role": "actor_fr", "text": "Réparé."}, ensure_ascii=False)
+        client = GeminiClient(cache=None)
+        client.session = mock.Mock()
+        client.session.post.side_effect = [sse_response(script), sse_response(repaired)]
+        agent = ListeningAgent(client, drive_client=None)
+
+        turns, result = [], {}
+        worker = threading.Thread(
+            target=lambda: result.setdefault("yielded", list(agent._stream_script("B1", "topic", False, "", turns))),
+            daemon=True,
+        )
+        worker.start()
+        worker.join(timeout=10)
+
+        self.assertFalse(worker.is_alive(), "repair waited on the rate-limiter slot held by its own stream")
+        self.assertEqual([turn["text"] for turn in result["yielded"]],
+                         ["Bonjour, voici l'été.", "Réparé.", "À demain."])
+        self.assertEqual(turns, result["yielded"])
+        self.assertEqual(self.limiter.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()